@@ -1,119 +1,1628 @@
 import time
 import os
+import sys
 import json
-import winreg
+import mmap
+import select
+import struct
+import fnmatch
+import heapq
+import tempfile
+import argparse
+import asyncio
+import threading
+import zlib
+from array import array
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, wait as futures_wait
 from datetime import datetime
 import re
+from collections import OrderedDict, namedtuple
+from itertools import chain, islice
+from types import MappingProxyType
 
-def get_steam_install_path():
+def get_cache_dir():
+    """Каталог для служебных файлов трекера (кэш пути Steam и т.п.)"""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser(r"~\AppData\Local")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "steam_download_tracker")
+
+def write_json_atomic(path, data):
+    """Записываем JSON атомарно: во временный файл рядом и затем os.replace"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def read_json(path):
+    """Читаем JSON-файл; None, если его нет или он поврежден"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def get_registry_steam_path():
     """Получаем путь установки Steam из реестра Windows"""
+    import winreg
+
+    key = winreg.OpenKey(winreg.HKEY_CURRENT_USER,
+                         r"Software\Valve\Steam")
     try:
-        key = winreg.OpenKey(winreg.HKEY_CURRENT_USER, 
-                           r"Software\Valve\Steam")
-        steam_path = winreg.QueryValueEx(key, "SteamPath")[0]
+        return winreg.QueryValueEx(key, "SteamPath")[0]
+    finally:
         winreg.CloseKey(key)
-        return steam_path
-    except Exception as e:
-        print(f"Ошибка при чтении реестра: {e}")
+
+def get_steam_path_candidates():
+    """Возможные пути установки Steam для текущей платформы, по приоритету"""
+    if sys.platform == "win32":
+        candidates = []
+        try:
+            candidates.append(get_registry_steam_path())
+        except Exception as e:
+            print(f"Ошибка при чтении реестра: {e}")
         # Попробуем стандартный путь
-        default_path = r"C:\Program Files (x86)\Steam"
-        if os.path.exists(default_path):
-            return default_path
+        candidates.append(r"C:\Program Files (x86)\Steam")
+        return candidates
+
+    home = os.path.expanduser("~")
+    if sys.platform == "darwin":
+        return [os.path.join(home, "Library", "Application Support", "Steam")]
+
+    flatpak = os.path.join(home, ".var", "app", "com.valvesoftware.Steam")
+    return [
+        # ~/.steam/steam - симлинк, который ведет на актуальную установку
+        os.path.join(home, ".steam", "steam"),
+        os.path.join(home, ".steam", "root"),
+        os.path.join(home, ".local", "share", "Steam"),
+        os.path.join(flatpak, ".local", "share", "Steam"),
+        os.path.join(flatpak, ".steam", "steam"),
+    ]
+
+def is_steam_root(path):
+    """Проверяем, похож ли каталог на корень установки Steam"""
+    return bool(path) and (os.path.isdir(os.path.join(path, "steamapps"))
+                           or os.path.isdir(os.path.join(path, "logs")))
+
+def get_steam_install_path(use_cache=True):
+    """Получаем путь установки Steam; найденный путь кэшируется на диске"""
+    cache_path = os.path.join(get_cache_dir(), "steam_path.json")
+    if use_cache:
+        cached = read_json(cache_path)
+        if isinstance(cached, dict) and is_steam_root(cached.get("steam_path")):
+            return cached["steam_path"]
+
+    for candidate in get_steam_path_candidates():
+        if is_steam_root(candidate):
+            steam_path = os.path.realpath(candidate)
+            try:
+                write_json_atomic(cache_path, {"steam_path": steam_path})
+            except OSError:
+                pass
+            return steam_path
+    return None
+
+class FileCache:
+    """Кэш результатов разбора файлов по ключу (путь, mtime_ns, размер, inode).
+
+    Для неизменившегося файла обращение стоит одного os.stat. Старые записи
+    вытесняются по LRU, когда оценка занятой памяти превышает max_bytes.
+    """
+
+    # Примерная стоимость самой записи и ключа
+    ENTRY_OVERHEAD = 256
+
+    def __init__(self, max_bytes=16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        # (путь, парсер) -> (ключ stat, stat, результат, стоимость)
+        self._entries = OrderedDict()
+        self._used = 0
+        self._lock = threading.Lock()
+
+    def get(self, path, parser):
+        """Возвращаем parser(path), разбирая файл заново только после его изменения"""
+        return self.get_with_stat(path, parser)[1]
+
+    def get_with_stat(self, path, parser):
+        """То же, что get, но вместе с результатом os.stat файла"""
+        st = os.stat(path)
+        stat_key = (st.st_mtime_ns, st.st_size, st.st_ino)
+        entry_key = (path, parser)
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is not None and entry[0] == stat_key:
+                self._entries.move_to_end(entry_key)
+                return st, entry[2]
+
+        # Разбор идет вне блокировки, чтобы разные файлы читались параллельно
+        value = parser(path)
+        cost = _estimate_size(value) + self.ENTRY_OVERHEAD
+        with self._lock:
+            self._discard(entry_key)
+            self._entries[entry_key] = (stat_key, st, value, cost)
+            self._used += cost
+            # Последнюю добавленную запись оставляем даже сверх бюджета
+            while self._used > self.max_bytes and len(self._entries) > 1:
+                _, old = self._entries.popitem(last=False)
+                self._used -= old[3]
+        return st, value
+
+    def invalidate(self, path):
+        """Удаляем все результаты разбора указанного файла"""
+        with self._lock:
+            for entry_key in [k for k in self._entries if k[0] == path]:
+                self._discard(entry_key)
+
+    def _discard(self, entry_key):
+        entry = self._entries.pop(entry_key, None)
+        if entry is not None:
+            self._used -= entry[3]
+
+def _estimate_size(value):
+    """Грубая оценка памяти, занятой результатом разбора"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += sys.getsizeof(key) + _estimate_size(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size += _estimate_size(item)
+    return size
+
+_file_cache = FileCache()
+
+class LogTailer:
+    """Инкрементальное чтение логов: помним inode и смещение каждого файла.
+
+    Ротацию (content_log.txt -> content_log.previous.txt) узнаем по inode:
+    сначала дочитываем хвост переименованного файла, затем новый файл
+    с начала, так что события на стыке не теряются и не повторяются.
+    """
+
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self):
+        # path -> [inode, смещение, неполная последняя строка]
+        self._files = {}
+        # path -> (переименованный файл, смещение, неполная строка) - недочитанный хвост
+        self._rotated = {}
+
+    def poll(self, path):
+        """Возвращаем (reset, генератор новых строк с прошлого опроса).
+
+        reset=True, если файл видим впервые, он был усечен или заменен
+        так, что прежний файл не найден, - тогда все выводы по старому
+        содержимому устарели. Генератор нужно дочитать до конца.
+        """
+        reset, state, size = self._check(path)
+        rotated = self._rotated.pop(path, None)
+        lines = iter(())
+        if state is not None and size > state[1]:
+            lines = self._read_lines(path, state, size)
+        if rotated is not None:
+            lines = chain(self._read_rotated_tail(*rotated), lines)
+        return reset, lines
+
+    def rotation_pending(self, path):
+        """Есть ли недочитанный хвост ротированного файла (его отдаст poll)"""
+        return path in self._rotated
+
+    def pending_range(self, path):
+        """Возвращаем (reset, начало, конец) еще не прочитанной части файла.
+
+        Для сканеров, которые сами читают байты (например, через mmap);
+        прочитанное подтверждается вызовом commit.
+        """
+        reset, state, size = self._check(path)
+        if state is None:
+            return reset, 0, 0
+        return reset, state[1] - len(state[2]), size
+
+    def commit(self, path, offset):
+        """Отмечаем, что файл обработан до смещения offset"""
+        state = self._files.get(path)
+        if state is not None:
+            state[1] = offset
+            state[2] = b""
+
+    def _check(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            # Файл могли только что переименовать, а новый еще не создан:
+            # состояние сохраняем, чтобы потом узнать ротацию
+            return False, None, 0
+
+        state = self._files.get(path)
+        if state is not None and state[0] != st.st_ino:
+            rotated = self._find_rotated(path, state[0])
+            if rotated is not None:
+                self._rotated[path] = (rotated, state[1], state[2])
+                state = [st.st_ino, 0, b""]
+                self._files[path] = state
+                return False, state, st.st_size
+
+        reset = state is None or state[0] != st.st_ino or st.st_size < state[1]
+        if reset:
+            state = [st.st_ino, 0, b""]
+            self._files[path] = state
+        return reset, state, st.st_size
+
+    def forget(self, path):
+        """Сбрасываем состояние файла, следующий опрос прочитает его с начала"""
+        self._files.pop(path, None)
+        self._rotated.pop(path, None)
+
+    @staticmethod
+    def _find_rotated(path, inode):
+        """Ищем рядом с path переименованный файл с тем же inode (*.previous.txt, *.1.txt)"""
+        directory, name = os.path.split(path)
+        stem, ext = os.path.splitext(name)
+        try:
+            with os.scandir(directory or ".") as entries:
+                for entry in entries:
+                    if (entry.name != name and entry.name.startswith(stem + ".")
+                            and entry.name.endswith(ext) and entry.inode() == inode):
+                        return entry.path
+        except OSError:
+            pass
+        return None
+
+    def _read_rotated_tail(self, rotated_path, offset, partial):
+        """Дочитываем ротированный файл от offset до конца"""
+        try:
+            f = open(rotated_path, 'rb')
+        except OSError:
+            return
+        with f:
+            f.seek(offset)
+            while True:
+                chunk = f.read(self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                lines = (partial + chunk).split(b'\n')
+                partial = lines[-1]
+                for line in lines[:-1]:
+                    yield line.rstrip(b'\r').decode('utf-8', errors='ignore')
+        # В ротированный файл больше не пишут, последняя строка завершена
+        if partial:
+            yield partial.rstrip(b'\r').decode('utf-8', errors='ignore')
+
+    # Сколько байт перед смещением хэшируем, чтобы узнать файл после перезапуска
+    FINGERPRINT_BYTES = 64
+
+    def to_state(self):
+        """Состояние для контрольной точки: path -> inode, смещение и отпечаток"""
+        result = {}
+        for path, (inode, offset, partial) in self._files.items():
+            # Неполную строку не сохраняем - после перезапуска она перечитается
+            offset -= len(partial)
+            try:
+                fingerprint = self._fingerprint(path, offset)
+            except OSError:
+                continue
+            result[path] = {"inode": inode, "offset": offset, "fingerprint": fingerprint}
+        return result
+
+    def restore(self, state):
+        """Восстанавливаем смещения из контрольной точки; возвращаем восстановленные пути.
+
+        Файл принимается, только если файл с тем же inode (сам или уже
+        ротированный) не короче сохраненного смещения и байты перед
+        смещением не изменились.
+        """
+        restored = []
+        for path, entry in state.items():
+            try:
+                inode, offset = entry["inode"], entry["offset"]
+                source = path
+                if os.stat(path).st_ino != inode:
+                    # Пока трекер не работал, лог могли ротировать - тогда
+                    # дочитаем переименованный файл при следующем опросе
+                    source = self._find_rotated(path, inode)
+                    if source is None:
+                        continue
+                if (os.stat(source).st_size < offset
+                        or self._fingerprint(source, offset) != entry["fingerprint"]):
+                    continue
+            except (OSError, KeyError, TypeError):
+                continue
+            self._files[path] = [inode, offset, b""]
+            restored.append(path)
+        return restored
+
+    def _fingerprint(self, path, offset):
+        start = max(0, offset - self.FINGERPRINT_BYTES)
+        with open(path, 'rb') as f:
+            f.seek(start)
+            return zlib.crc32(f.read(offset - start))
+
+    def _read_lines(self, path, state, size):
+        with open(path, 'rb') as f:
+            f.seek(state[1])
+            while state[1] < size:
+                chunk = f.read(min(self.CHUNK_SIZE, size - state[1]))
+                if not chunk:
+                    break
+                lines = (state[2] + chunk).split(b'\n')
+                # Смещение сдвигаем только после отдачи всех строк блока,
+                # чтобы прерванный потребитель перечитал их в следующий раз
+                for line in lines[:-1]:
+                    yield line.rstrip(b'\r').decode('utf-8', errors='ignore')
+                state[1] += len(chunk)
+                state[2] = lines[-1]
+
+def _mmap_line(mm, pos):
+    """Декодируем только строку, в которой находится позиция pos"""
+    start = mm.rfind(b'\n', 0, pos) + 1
+    end = mm.find(b'\n', pos)
+    if end == -1:
+        end = len(mm)
+    return start, mm[start:end].rstrip(b'\r').decode('utf-8', errors='ignore')
+
+def mmap_iter_matches_reversed(path, needles, window=None):
+    """Отдаем строки с любой из байтовых подстрок needles, от конца файла к началу.
+
+    Поиск идет по сырым байтам через mmap.rfind, декодируются только
+    найденные строки. window ограничивает поиск последними window байтами,
+    чтобы стоимость не росла с размером файла.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            end = len(mm)
+            lower = max(0, end - window) if window is not None else 0
+            positions = [mm.rfind(needle, lower, end) for needle in needles]
+            while True:
+                pos = max(positions)
+                if pos == -1:
+                    return
+                line_start, line = _mmap_line(mm, pos)
+                yield line
+                end = line_start
+                # Вхождения внутри уже отданной строки ищем заново левее нее
+                positions = [p if p < end else mm.rfind(needle, lower, end)
+                             for p, needle in zip(positions, needles)]
+
+def mmap_scan_any(path, needles, start=0, end=None):
+    """Проверяем, есть ли в байтах [start, end) любая из подстрок needles.
+
+    Смотрим только завершенные строки; возвращаем (найдено ли, смещение
+    после последнего перевода строки), чтобы дописываемая строка была
+    проверена целиком при следующем вызове.
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        end = size if end is None else min(end, size)
+        if end <= start:
+            return False, start
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            last_newline = mm.rfind(b'\n', start, end)
+            if last_newline == -1:
+                return False, start
+            end = last_newline + 1
+            found = any(mm.find(needle, start, end) != -1 for needle in needles)
+            return found, end
+
+def iter_lines_reversed(path, block_size=64 * 1024):
+    """Отдаем строки файла от конца к началу, читая его блоками с конца.
+
+    Читается только та часть файла, которую потребитель успел запросить,
+    поэтому поиск последней подходящей строки не зависит от размера лога.
+    """
+    with open(path, 'rb') as f:
+        pos = size = f.seek(0, os.SEEK_END)
+        tail = b""
+        first_block = True
+        while pos > 0:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            lines = (f.read(step) + tail).split(b'\n')
+            tail = lines[0]
+            rest = lines[1:]
+            if first_block:
+                # Перевод строки в самом конце файла не дает пустой строки
+                if rest and not rest[-1]:
+                    rest.pop()
+                first_block = False
+            for line in reversed(rest):
+                yield line.rstrip(b'\r').decode('utf-8', errors='ignore')
+        if size:
+            yield tail.rstrip(b'\r').decode('utf-8', errors='ignore')
+
+class LogTimestampParser:
+    """Разбор префикса "[YYYY-MM-DD HH:MM:SS]" в Unix-время (локальное).
+
+    Полночь текущей даты вычисляется один раз и кэшируется, поэтому для
+    большинства строк остается срез фиксированных позиций и сложение целых.
+    В дни перехода на летнее/зимнее время сутки не равны 86400 с - для
+    таких дат каждая строка считается через time.mktime.
+
+    Один экземпляр разделяют потоки нескольких корней Steam, поэтому
+    текущие дата и полночь хранятся одним кортежем и читаются за вызов
+    один раз - поток не увидит дату от одного дня и полночь от другого.
+    """
+
+    __slots__ = ("_current", "_days")
+
+    # Сколько дат держим в кэше (логи за разные дни при слиянии ленты)
+    MAX_CACHED_DAYS = 64
+
+    def __init__(self):
+        # (дата "YYYY-MM-DD", полночь или None)
+        self._current = (None, None)
+        # дата "YYYY-MM-DD" -> полночь в Unix-времени или None для дней с переходом времени
+        self._days = {}
+
+    def __call__(self, line):
+        """Возвращаем Unix-время строки или None, если префикса нет"""
+        if len(line) < 21 or line[0] != '[' or line[20] != ']':
+            return None
+        date = line[1:11]
+        current = self._current
+        if date != current[0]:
+            current = self._switch_date(date)
+            if current is None:
+                return None
+        try:
+            seconds = int(line[12:14]) * 3600 + int(line[15:17]) * 60 + int(line[18:20])
+        except ValueError:
+            return None
+        midnight = current[1]
+        if midnight is None:
+            return self._slow_path(line)
+        return midnight + seconds
+
+    def _switch_date(self, date):
+        midnight = self._days.get(date, False)
+        if midnight is False:
+            try:
+                year, month, day = int(date[0:4]), int(date[5:7]), int(date[8:10])
+                midnight = time.mktime((year, month, day, 0, 0, 0, 0, 0, -1))
+                next_midnight = time.mktime((year, month, day + 1, 0, 0, 0, 0, 0, -1))
+            except (ValueError, OverflowError):
+                return None
+            if next_midnight - midnight != 86400:
+                midnight = None
+            if len(self._days) >= self.MAX_CACHED_DAYS:
+                self._days.clear()
+            self._days[date] = midnight
+        current = self._current = (date, midnight)
+        return current
+
+    @staticmethod
+    def _slow_path(line):
+        try:
+            return time.mktime((int(line[1:5]), int(line[6:8]), int(line[9:11]),
+                                int(line[12:14]), int(line[15:17]), int(line[18:20]),
+                                0, 0, -1))
+        except (ValueError, OverflowError):
+            return None
+
+# Общий источник времени для всех разборщиков логов
+parse_log_timestamp = LogTimestampParser()
+
+class LogEvent:
+    """Событие content_log: время (Unix) и appid уже разобраны"""
+
+    __slots__ = ("timestamp", "appid")
+
+    def __init__(self, timestamp, appid):
+        self.timestamp = timestamp
+        self.appid = appid
+
+    def __repr__(self):
+        fields = []
+        for cls in reversed(type(self).__mro__):
+            fields.extend(getattr(cls, "__slots__", ()))
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in fields)
+        return f"{type(self).__name__}({values})"
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name)
+            for cls in type(self).__mro__ for name in getattr(cls, "__slots__", ()))
+
+    __hash__ = None
+
+class AppUpdateStart(LogEvent):
+    """Начало обновления приложения: "AppID N update started : download X/Y" """
+
+    __slots__ = ("bytes_done", "bytes_total", "name")
+
+    def __init__(self, timestamp, appid, bytes_done=0, bytes_total=0, name=None):
+        LogEvent.__init__(self, timestamp, appid)
+        self.bytes_done = bytes_done
+        self.bytes_total = bytes_total
+        self.name = name
+
+class StateChange(LogEvent):
+    """Смена состояния ("state changed") или фазы обновления ("update changed")"""
+
+    __slots__ = ("states", "is_update")
+
+    def __init__(self, timestamp, appid, states, is_update=False):
+        LogEvent.__init__(self, timestamp, appid)
+        self.states = states
+        self.is_update = is_update
+
+class DepotProgress(LogEvent):
+    """Прогресс загрузки депо: скачано bytes_done из bytes_total"""
+
+    __slots__ = ("depot_id", "bytes_done", "bytes_total")
+
+    def __init__(self, timestamp, appid, depot_id, bytes_done, bytes_total):
+        LogEvent.__init__(self, timestamp, appid)
+        self.depot_id = depot_id
+        self.bytes_done = bytes_done
+        self.bytes_total = bytes_total
+
+class Paused(LogEvent):
+    """Обновление приостановлено (пауза пользователя или Suspended)"""
+
+    __slots__ = ("reason",)
+
+    def __init__(self, timestamp, appid, reason=""):
+        LogEvent.__init__(self, timestamp, appid)
+        self.reason = reason
+
+class Finished(LogEvent):
+    """Обновление завершено или приложение снято с расписания.
+
+    result - итог из "(result ...)", например "No Error" или "Suspended";
+    пустая строка, если итога в строке нет.
+    """
+
+    __slots__ = ("result",)
+
+    def __init__(self, timestamp, appid, result=""):
+        LogEvent.__init__(self, timestamp, appid)
+        self.result = result
+
+# Регулярные выражения отдельных событий. Какое из них применить, решает
+# дешевая проверка литерального префикса в parse_content_log_line, так что
+# на строку приходится не больше одного регулярного выражения
+_DOWNLOAD_COUNTERS_RE = re.compile(r'download (\d+)/(\d+)')
+_DEPOT_PROGRESS_RE = re.compile(r'Depot (\d+)\b.*?\bdownload (\d+)/(\d+)')
+_LEGACY_DOWNLOAD_RE = re.compile(r'Downloading app (\d+)\s+(.+)')
+_FINISH_RESULT_RE = re.compile(r'\(result ([^,)]*)')
+
+def _event_details(rest):
+    """Текст после " : " в строке события (или весь остаток, если двоеточия нет)"""
+    colon = rest.find(':')
+    return (rest[colon + 1:] if colon != -1 else rest).strip()
+
+def _update_started(timestamp, appid, rest):
+    match = _DOWNLOAD_COUNTERS_RE.search(rest)
+    if match is None:
+        return AppUpdateStart(timestamp, appid)
+    return AppUpdateStart(timestamp, appid, int(match.group(1)), int(match.group(2)))
+
+def _state_changed(timestamp, appid, rest):
+    states = tuple(s.strip() for s in _event_details(rest).split(",") if s.strip())
+    return StateChange(timestamp, appid, states, False)
+
+def _update_changed(timestamp, appid, rest):
+    states = tuple(s.strip() for s in _event_details(rest).split(",") if s.strip())
+    return StateChange(timestamp, appid, states, True)
+
+def _paused(timestamp, appid, rest):
+    return Paused(timestamp, appid, _event_details(rest))
+
+def _finished(timestamp, appid, rest):
+    match = _FINISH_RESULT_RE.search(rest)
+    return Finished(timestamp, appid, match.group(1).strip() if match else "")
+
+# Начало текста после "AppID N " -> обработчик события
+_APP_EVENT_HANDLERS = (
+    ("update started", _update_started),
+    ("state changed", _state_changed),
+    ("update changed", _update_changed),
+    ("update canceled", _paused),
+    ("update paused", _paused),
+    ("paused", _paused),
+    ("finished update", _finished),
+    ("scheduler finished", _finished),
+)
+
+_EVENT_MARKERS = ("AppID ", "Depot ", "Downloading app ")
+
+def parse_content_log_line(line):
+    """Превращаем строку content_log в LogEvent; None для строк без событий"""
+    timestamp = parse_log_timestamp(line)
+    if timestamp is not None:
+        # Событие идет сразу после "[дата время] "
+        start = 22
+    else:
+        positions = [p for p in (line.find(m) for m in _EVENT_MARKERS) if p != -1]
+        if not positions:
+            return None
+        start = min(positions)
+
+    if line.startswith("AppID ", start):
+        space = line.find(" ", start + 6)
+        appid = line[start + 6:space]
+        if space == -1 or not appid.isdigit():
+            return None
+        for prefix, handler in _APP_EVENT_HANDLERS:
+            if line.startswith(prefix, space + 1):
+                return handler(timestamp, int(appid), line[space + 1 + len(prefix):])
+        return None
+
+    if line.startswith("Depot ", start):
+        match = _DEPOT_PROGRESS_RE.match(line, start)
+        if match is None:
+            return None
+        return DepotProgress(timestamp, 0, int(match.group(1)),
+                             int(match.group(2)), int(match.group(3)))
+
+    if line.startswith("Downloading app ", start):
+        match = _LEGACY_DOWNLOAD_RE.match(line, start)
+        if match is None:
+            return None
+        return AppUpdateStart(timestamp, int(match.group(1)), name=match.group(2).strip())
+    return None
+
+def parse_content_log(lines):
+    """Разбираем поток строк content_log в поток событий, пропуская остальное"""
+    for line in lines:
+        event = parse_content_log_line(line)
+        if event is not None:
+            yield event
+
+# Состояния загрузки приложения
+SESSION_QUEUED = "queued"
+SESSION_DOWNLOADING = "downloading"
+SESSION_STAGING = "staging"
+SESSION_VERIFYING = "verifying"
+SESSION_PAUSED = "paused"
+SESSION_FINISHED = "finished"
+
+SESSION_STATES = (SESSION_QUEUED, SESSION_DOWNLOADING, SESSION_STAGING,
+                  SESSION_VERIFYING, SESSION_PAUSED, SESSION_FINISHED)
+SESSION_ACTIVE_STATES = (SESSION_DOWNLOADING, SESSION_STAGING, SESSION_VERIFYING)
+
+SESSION_LABELS = {
+    SESSION_QUEUED: "в очереди",
+    SESSION_DOWNLOADING: "загрузка",
+    SESSION_STAGING: "распаковка",
+    SESSION_VERIFYING: "проверка",
+    SESSION_PAUSED: "пауза",
+    SESSION_FINISHED: "завершено",
+}
+
+# Итоги "scheduler finished", при которых загрузка действительно завершена
+FINISHED_RESULTS = ("No Error",)
+
+# Фазы из "update changed" -> состояние; при нескольких фазах берется последняя известная
+UPDATE_PHASE_STATES = {
+    "Downloading": SESSION_DOWNLOADING,
+    "Preallocating": SESSION_DOWNLOADING,
+    "Reconfiguring": SESSION_DOWNLOADING,
+    "Staging": SESSION_STAGING,
+    "Committing": SESSION_STAGING,
+    "Verifying": SESSION_VERIFYING,
+    "Validating": SESSION_VERIFYING,
+    "Paused": SESSION_PAUSED,
+    "Suspended": SESSION_PAUSED,
+}
+
+class DownloadSessionTracker:
+    """Конечный автомат состояния загрузки каждого приложения.
+
+    Питается событиями content_log по мере их появления; текущее состояние
+    приложения и общий статус отдаются за O(1) без перечитывания логов.
+    """
+
+    def __init__(self):
+        # appid -> (состояние, время последнего события)
+        self._apps = {}
+        # appid -> состояние, только для незавершенных загрузок
+        self._unfinished = {}
+        self._counts = dict.fromkeys(SESSION_STATES, 0)
+
+    def reset(self):
+        """Забываем все состояния (лог заменен или усечен)"""
+        self._apps.clear()
+        self._unfinished.clear()
+        self._counts = dict.fromkeys(SESSION_STATES, 0)
+
+    def feed(self, event):
+        """Применяем одно событие LogEvent"""
+        state = self._next_state(event)
+        if state is not None:
+            self._set_state(event.appid, state, event.timestamp)
+
+    def feed_all(self, events):
+        for event in events:
+            self.feed(event)
+
+    def state(self, appid):
+        """Текущее состояние приложения или None, если событий по нему не было"""
+        entry = self._apps.get(appid)
+        return entry[0] if entry is not None else None
+
+    def apps(self):
+        """Словарь appid -> состояние"""
+        return {appid: entry[0] for appid, entry in self._apps.items()}
+
+    def unfinished(self):
+        """Словарь appid -> состояние для приложений, чья загрузка не завершена"""
+        return dict(self._unfinished)
+
+    def count(self, state):
+        """Число приложений в указанном состоянии"""
+        return self._counts[state]
+
+    def overall_status(self):
+        """Общий статус: "активно", "пауза" или "неактивно" """
+        if any(self._counts[state] for state in SESSION_ACTIVE_STATES):
+            return "активно"
+        if self._counts[SESSION_PAUSED]:
+            return "пауза"
+        return "неактивно"
+
+    def to_state(self):
+        """Состояние для контрольной точки"""
+        return {str(appid): [state, timestamp] for appid, (state, timestamp) in self._apps.items()}
+
+    def restore(self, state):
+        """Восстанавливаем состояния приложений из контрольной точки"""
+        self.reset()
+        for appid, (app_state, timestamp) in state.items():
+            if app_state in self._counts:
+                self._set_state(int(appid), app_state, timestamp)
+
+    def _set_state(self, appid, state, timestamp):
+        previous = self._apps.get(appid)
+        if previous is not None:
+            self._counts[previous[0]] -= 1
+        self._apps[appid] = (state, timestamp)
+        self._counts[state] += 1
+        if state == SESSION_FINISHED:
+            self._unfinished.pop(appid, None)
+        else:
+            self._unfinished[appid] = state
+
+    def _next_state(self, event):
+        if isinstance(event, Paused):
+            return SESSION_PAUSED
+        if isinstance(event, Finished):
+            return self._finished_state(event.result)
+        if isinstance(event, AppUpdateStart):
+            return SESSION_DOWNLOADING
+        if not isinstance(event, StateChange):
+            # Прогресс депо не привязан к appid и состояние не меняет
+            return None
+
+        states = event.states
+        if event.is_update:
+            phase = None
+            for name in states:
+                phase = UPDATE_PHASE_STATES.get(name, phase)
+            return phase
+
+        current = self.state(event.appid)
+        if "Update Paused" in states or "Update Suspended" in states:
+            return SESSION_PAUSED
+        if "Update Running" in states or "Update Started" in states:
+            # Фаза (staging/verifying) уточняется событиями "update changed"
+            if current in SESSION_ACTIVE_STATES:
+                return current
+            return SESSION_DOWNLOADING
+        if "Update Queued" in states:
+            return SESSION_QUEUED
+        if "Fully Installed" in states and "Update Required" not in states:
+            return SESSION_FINISHED
         return None
 
+    @staticmethod
+    def _finished_state(result):
+        # Снятие с расписания бывает и при паузе ("result Suspended"), и при
+        # ошибке (нет места, ошибка записи) - Steam в обоих случаях ставит
+        # загрузку на паузу. Завершена она только с "No Error"; строка
+        # "finished update" итога не содержит и означает конец обновления
+        if not result or result in FINISHED_RESULTS:
+            return SESSION_FINISHED
+        return SESSION_PAUSED
+
+_content_log_tailer = LogTailer()
+_download_sessions = DownloadSessionTracker()
+
+# Метки строк с событиями content_log для быстрой проверки по байтам
+CONTENT_EVENT_MARKERS = (b"AppID ", b"Depot ", b"Downloading app ")
+
 def get_downloading_game_name(steam_path):
-    """Получаем название загружаемой игры из логов"""
-    logs_dir = os.path.join(steam_path, "logs")
-    
-    if not os.path.exists(logs_dir):
-        return "Неизвестная игра"
-    
-    # Ищем последний лог-файл
-    log_files = [f for f in os.listdir(logs_dir) 
-                if f.startswith("content_log") and f.endswith(".txt")]
-    
-    if not log_files:
-        return "Неизвестная игра"
-    
-    # Берем самый свежий лог
-    latest_log = max(log_files)
-    log_path = os.path.join(logs_dir, latest_log)
-    
+    """Получаем название загружаемой игры из логов (ждем разбора лога без бюджета времени)"""
+    snapshot = get_default_registry().collect(steam_path, names=("logs",), wait=True)
+    return resolve_snapshot(snapshot).game_name
+
+def active_session_game_name(sessions):
+    """Название из индекса для приложения, которое сейчас качается (sessions - appid -> состояние)"""
+    for appid, state in sessions.items():
+        if state in SESSION_ACTIVE_STATES:
+            game_name = _app_names.get(appid)
+            if game_name:
+                return game_name
+    return None
+
+def find_game_name_in_logs(logs_dir):
+    """Название игры из content_log*.txt или None"""
+    # Сначала текущий лог, затем ротированные - название могло остаться там
+    for log_path in get_content_logs(logs_dir):
+        game_name = _file_cache.get(log_path, find_game_name_in_log)
+        if game_name:
+            return game_name
+    return None
+
+def get_content_logs(logs_dir):
+    """content_log*.txt от нового к старому: content_log.txt, затем ротированные по mtime"""
+    logs = []
+    with os.scandir(logs_dir) as entries:
+        for entry in entries:
+            if entry.name.startswith("content_log") and entry.name.endswith(".txt"):
+                try:
+                    mtime = entry.stat().st_mtime_ns
+                except OSError:
+                    continue
+                # Текущий лог всегда первый, даже если mtime у ротированного больше
+                logs.append((entry.name != "content_log.txt", -mtime, entry.path))
+    logs.sort()
+    return [path for _, _, path in logs]
+
+# Байтовые метки строк, из которых можно достать название игры
+GAME_NAME_MARKERS = (b'Downloading app ', b'"appid"')
+# Название ищем только в хвосте лога: последние 100 строк или 64 КБ
+GAME_NAME_SEARCH_LINES = 100
+GAME_NAME_SEARCH_BYTES = 64 * 1024
+
+def find_game_name_in_log(log_path):
+    """Ищем название игры в последней подходящей строке лога; None, если не нашли"""
     try:
-        with open(log_path, 'r', encoding='utf-8', errors='ignore') as f:
-            lines = f.readlines()
+        # Ищем метки по сырым байтам с конца файла, декодируя только найденные строки
+        lines = mmap_iter_matches_reversed(log_path, GAME_NAME_MARKERS,
+                                           window=GAME_NAME_SEARCH_BYTES)
+        for line in lines:
+            game_name = game_name_from_line(line)
+            if game_name:
+                return game_name
+        return None
+    except (ValueError, OSError):
+        pass
+    # mmap недоступен (например, специальная ФС) - читаем файл с конца блоками
+    for line in islice(iter_lines_reversed(log_path), GAME_NAME_SEARCH_LINES):
+        game_name = game_name_from_line(line)
+        if game_name:
+            return game_name
+    return None
+
+def game_name_from_line(line):
+    """Достаем название игры из строки лога; None, если его там нет"""
+    if '"appid"' in line and '"name"' in line:
+        try:
+            # Пробуем извлечь JSON
+            json_start = line.find('{')
+            if json_start != -1:
+                data = json.loads(line[json_start:])
+                if 'name' in data:
+                    return data['name']
+        except:
+            pass
             
-        # Ищем строки с информацией о загрузке
-        for line in reversed(lines[-100:]):  # Проверяем последние 100 строк
-            if '"appid"' in line and '"name"' in line:
-                try:
-                    # Пробуем извлечь JSON
-                    json_start = line.find('{')
-                    if json_start != -1:
-                        data = json.loads(line[json_start:])
-                        if 'name' in data:
-                            return data['name']
-                except:
-                    pass
-                    
-            # Альтернативный способ - поиск по шаблону
-            match = re.search(r'Downloading app (\d+)\s+(.+?)(?:\n|$)', line)
-            if match:
-                return match.group(2).strip()
-                
-    except Exception as e:
-        print(f"Ошибка при чтении лога: {e}")
-    
-    return "Неизвестная игра"
+    # Альтернативный способ - строка "Downloading app N <название>";
+    # регулярное выражение применяется только после дешевой проверки подстроки
+    if "Downloading app " in line:
+        # Фраза может стоять не сразу после времени ("Starting: Downloading app ...")
+        match = _LEGACY_DOWNLOAD_RE.search(line)
+        if match:
+            return match.group(2).strip()
+    return None
 
-def get_download_status(steam_path):
-    """Получаем статус загрузки из логов"""
+# Логи, которые сводятся в общую ленту для разбора медленных загрузок
+TIMELINE_LOG_PATTERNS = (
+    "content_log.txt",
+    "connection_log.txt",
+    "bootstrap_log.txt",
+    "*cdn*.txt",
+)
+
+# Строка общей ленты: время (Unix), имя лога-источника и сама строка
+TimelineEntry = namedtuple("TimelineEntry", ["timestamp", "source", "line"])
+
+def _timestamped_lines(lines):
+    """Добавляем к строкам время; строки без метки времени (продолжения) наследуют предыдущую"""
+    timestamp = 0.0
+    for line in lines:
+        parsed = parse_log_timestamp(line)
+        if parsed is not None:
+            timestamp = parsed
+        yield timestamp, line
+
+def merge_log_timelines(sources):
+    """Сливаем несколько потоков строк в один по времени (k-way merge на куче).
+
+    sources - словарь имя лога -> итерируемые строки. В куче лежит не больше
+    одной строки от каждого источника, так что память - O(число логов).
+    При равном времени порядок определяется порядком источников.
+    """
+    heap = []
+    for index, (name, lines) in enumerate(sources.items()):
+        iterator = _timestamped_lines(lines)
+        first = next(iterator, None)
+        if first is not None:
+            heap.append((first[0], index, first[1], name, iterator))
+    heapq.heapify(heap)
+
+    while heap:
+        timestamp, index, line, name, iterator = heap[0]
+        yield TimelineEntry(timestamp, name, line)
+        following = next(iterator, None)
+        if following is None:
+            heapq.heappop(heap)
+        else:
+            heapq.heapreplace(heap, (following[0], index, following[1], name, iterator))
+
+def get_timeline_logs(logs_dir, patterns=TIMELINE_LOG_PATTERNS):
+    """Пути логов для общей ленты в порядке шаблонов"""
+    try:
+        names = sorted(os.listdir(logs_dir))
+    except OSError:
+        return []
+    paths = []
+    for pattern in patterns:
+        for name in fnmatch.filter(names, pattern):
+            path = os.path.join(logs_dir, name)
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+def _iter_file_lines(path):
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            yield line.rstrip('\r\n')
+
+def read_log_timeline(logs_dir, patterns=TIMELINE_LOG_PATTERNS):
+    """Вся история логов одной лентой по времени; файлы читаются потоково"""
+    sources = {os.path.basename(path): _iter_file_lines(path)
+               for path in get_timeline_logs(logs_dir, patterns)}
+    return merge_log_timelines(sources)
+
+class LogTimeline:
+    """Общая лента новых строк нескольких логов.
+
+    Один LogTailer хранит inode и смещение каждого лога отдельно; первый
+    опрос отдает всю историю, следующие - только дописанные строки.
+    """
+
+    def __init__(self, logs_dir, patterns=TIMELINE_LOG_PATTERNS, tailer=None):
+        self.logs_dir = logs_dir
+        self.patterns = patterns
+        self._tailer = tailer or LogTailer()
+
+    def poll(self):
+        """Строки, дописанные во все логи с прошлого опроса, упорядоченные по времени"""
+        sources = {}
+        for path in get_timeline_logs(self.logs_dir, self.patterns):
+            _, lines = self._tailer.poll(path)
+            sources[os.path.basename(path)] = lines
+        return merge_log_timelines(sources)
+
+# Как часто опрашивать логи в режиме --follow, с
+TIMELINE_FOLLOW_INTERVAL = 1.0
+
+def print_log_timeline(steam_path, follow=False, interval=TIMELINE_FOLLOW_INTERVAL):
+    """Выводим общую ленту content/connection/bootstrap логов.
+
+    follow=True - после истории продолжаем выводить новые строки по мере
+    их появления, пока процесс не прервут.
+    """
     logs_dir = os.path.join(steam_path, "logs")
-    
-    if not os.path.exists(logs_dir):
-        return "пауза", 0
-    
-    # Проверяем файл downloading_stats.txt (если есть)
+    if not follow:
+        for entry in read_log_timeline(logs_dir):
+            print(f"{entry.source:<20} {entry.line}")
+        return
+
+    timeline = LogTimeline(logs_dir)
+    scheduler = TickScheduler(interval)
+    while True:
+        for entry in timeline.poll():
+            print(f"{entry.source:<20} {entry.line}", flush=True)
+        scheduler.wait()
+
+# Токены текстового формата KeyValues (VDF/ACF)
+VDF_STRING = "string"
+VDF_OPEN = "{"
+VDF_CLOSE = "}"
+
+_VDF_TOKEN_RE = re.compile(r'''
+    (?P<skip>\s+|//[^\n]*|\[[^\]\n]*\])       # пробелы, комментарии, условия [$WIN32]
+  | "(?P<quoted>(?:[^"\\]|\\.)*)"            # строка в кавычках
+  | (?P<brace>[{}])
+  | (?P<bare>[^\s{}"]+)                      # строка без кавычек
+''', re.VERBOSE | re.DOTALL)
+
+_VDF_ESCAPES = {'n': '\n', 't': '\t', '\\': '\\', '"': '"'}
+
+def _vdf_unescape(value):
+    if '\\' not in value:
+        return value
+    return re.sub(r'\\(.)', lambda m: _VDF_ESCAPES.get(m.group(1), m.group(0)), value)
+
+def vdf_tokenize(f, chunk_size=64 * 1024):
+    """Разбиваем VDF-поток на токены (тип, значение), читая файл блоками"""
+    buf = ""
+    pos = 0
+    eof = False
+    while True:
+        match = _VDF_TOKEN_RE.match(buf, pos)
+        # Токен у края буфера может продолжаться в следующем блоке
+        if not eof and (match is None or match.end() == len(buf)):
+            chunk = f.read(chunk_size)
+            buf = buf[pos:] + chunk
+            pos = 0
+            eof = not chunk
+            continue
+        if match is None:
+            if pos < len(buf):
+                raise ValueError(f"Некорректный VDF рядом с {buf[pos:pos + 20]!r}")
+            return
+        pos = match.end()
+        if match.lastgroup == "quoted":
+            yield VDF_STRING, _vdf_unescape(match.group("quoted"))
+        elif match.lastgroup == "bare":
+            yield VDF_STRING, match.group("bare")
+        elif match.lastgroup == "brace":
+            yield match.group("brace"), None
+
+def _vdf_pairs(f):
+    """Проходим VDF за один проход: (путь секции, ключ, значение или VDF_OPEN/VDF_CLOSE)"""
+    path = []
+    key = None
+    for kind, value in vdf_tokenize(f):
+        if kind == VDF_STRING:
+            if key is None:
+                key = value
+            else:
+                yield tuple(path), key, value
+                key = None
+        elif kind == VDF_OPEN:
+            if key is None:
+                raise ValueError("Секция VDF без имени")
+            yield tuple(path), key, VDF_OPEN
+            path.append(key)
+            key = None
+        else:
+            if not path or key is not None:
+                raise ValueError("Непарная закрывающая скобка в VDF")
+            path.pop()
+            yield tuple(path), None, VDF_CLOSE
+    if path or key is not None:
+        raise ValueError("Неожиданный конец VDF")
+
+def vdf_parse(f):
+    """Разбираем VDF/ACF в вложенные словари за один проход"""
+    root = {}
+    stack = [root]
+    for _path, key, value in _vdf_pairs(f):
+        if value is VDF_OPEN:
+            section = {}
+            stack[-1][key] = section
+            stack.append(section)
+        elif value is VDF_CLOSE:
+            stack.pop()
+        else:
+            stack[-1][key] = value
+    return root
+
+def vdf_extract(f, keys):
+    """Потоково достаем только нужные ключи: (путь секции, ключ, значение).
+
+    Ключи сравниваются без учета регистра, как это делает Steam; словари
+    при этом не строятся, так что большие файлы не держатся в памяти целиком.
+    """
+    wanted = {k.lower() for k in keys}
+    for path, key, value in _vdf_pairs(f):
+        if value is not VDF_OPEN and value is not VDF_CLOSE and key.lower() in wanted:
+            yield path, key, value
+
+def load_vdf(path):
+    """Читаем VDF/ACF-файл в словарь"""
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        return vdf_parse(f)
+
+def get_library_folders(steam_path):
+    """Получаем список библиотек Steam из libraryfolders.vdf (основная - первой)"""
+    library_folders_path = os.path.join(steam_path, "steamapps", "libraryfolders.vdf")
+    try:
+        paths = _file_cache.get(library_folders_path, read_library_paths)
+    except (OSError, ValueError):
+        paths = []
+
+    libraries = [steam_path]
+    seen = {os.path.normcase(os.path.normpath(steam_path))}
+    for path in paths:
+        key = os.path.normcase(os.path.normpath(path))
+        if key not in seen:
+            seen.add(key)
+            libraries.append(path)
+    return libraries
+
+def read_library_paths(library_folders_path):
+    """Читаем пути библиотек из libraryfolders.vdf"""
+    data = load_vdf(library_folders_path)
+    folders = data.get("libraryfolders") or data.get("LibraryFolders") or {}
+    paths = []
+    for name, entry in folders.items():
+        # Новый формат: "0" { "path" "..." }, старый: "1" "D:\\SteamLibrary"
+        if isinstance(entry, dict):
+            path = entry.get("path")
+        else:
+            path = entry if name.isdigit() else None
+        if path:
+            paths.append(path)
+    return paths
+
+def read_library_download_state(library_folders_path):
+    """Ищем в libraryfolders.vdf активную загрузку: (активна ли, байт/с)"""
+    # Значения собираем по секциям: активна та, где "downloading" "1"
+    sections = {}
+    with open(library_folders_path, 'r', encoding='utf-8', errors='ignore') as f:
+        for section, key, value in vdf_extract(f, ("downloading", "bytespersecond")):
+            sections.setdefault(section, {})[key.lower()] = value
+    for values in sections.values():
+        if values.get("downloading") == "1":
+            speed = values.get("bytespersecond", "0")
+            return True, int(speed) if speed.isdigit() else 0
+    return False, 0
+
+def read_stats_paused(stats_file):
+    """Проверяем, отмечена ли пауза в downloading_stats.txt"""
+    with open(stats_file, 'r', encoding='utf-8', errors='ignore') as f:
+        return "paused" in f.read().lower()
+
+# Флаги StateFlags из appmanifest_*.acf
+APP_STATE_UPDATE_REQUIRED = 0x2
+APP_STATE_FULLY_INSTALLED = 0x4
+APP_STATE_UPDATE_RUNNING = 0x100
+APP_STATE_UPDATE_PAUSED = 0x200
+APP_STATE_UPDATE_STARTED = 0x400
+# Steam сохраняет в манифест то "Update Running", то "Update Started"
+APP_STATE_UPDATING = APP_STATE_UPDATE_RUNNING | APP_STATE_UPDATE_STARTED
+
+# Прогресс приложения по данным appmanifest; speed - байт/с, percent - 0..100
+ManifestProgress = namedtuple("ManifestProgress", [
+    "appid", "name", "state_flags",
+    "bytes_downloaded", "bytes_to_download", "bytes_staged", "bytes_to_stage",
+    "speed", "percent",
+])
+
+class ManifestProgressTracker:
+    """Прогресс загрузки по appmanifest_*.acf со скоростью по разнице значений"""
+
+    MANIFEST_KEYS = ("appid", "name", "StateFlags", "BytesDownloaded",
+                     "BytesToDownload", "BytesStaged", "BytesToStage")
+    # Если Steam не переписывал манифест дольше этого, скорость считаем нулевой
+    STALE_AFTER = 120
+
+    def __init__(self, cache=None, clock=time.time):
+        self._cache = cache if cache is not None else _file_cache
+        self._clock = clock
+        # appid -> (mtime_ns, BytesDownloaded, скорость)
+        self._samples = {}
+
+    def update(self, path):
+        """Возвращаем ManifestProgress; файл перечитывается только если изменились mtime или размер"""
+        st, values = self._cache.get_with_stat(path, read_manifest_values)
+
+        appid = values.get("appid", "")
+        downloaded = values.get("bytesdownloaded", 0)
+        to_download = values.get("bytestodownload", 0)
+        flags = values.get("stateflags", 0)
+
+        # Время записи значений берем из mtime манифеста - это момент,
+        # когда Steam их сохранил, а не момент нашего опроса
+        prev = self._samples.get(appid)
+        if prev is None or downloaded < prev[1]:
+            self._samples[appid] = (st.st_mtime_ns, downloaded, 0.0)
+        elif st.st_mtime_ns > prev[0]:
+            # Манифест переписан без роста байт (например, при распаковке) - скорость нулевая
+            speed = (downloaded - prev[1]) * 1e9 / (st.st_mtime_ns - prev[0])
+            self._samples[appid] = (st.st_mtime_ns, downloaded, speed)
+
+        speed = self._samples[appid][2]
+        stale = self._clock() - st.st_mtime_ns / 1e9 > self.STALE_AFTER
+        if stale or not flags & APP_STATE_UPDATING or flags & APP_STATE_UPDATE_PAUSED:
+            speed = 0.0
+
+        percent = downloaded * 100.0 / to_download if to_download else 0.0
+        return ManifestProgress(
+            appid, values.get("name", ""), flags,
+            downloaded, to_download,
+            values.get("bytesstaged", 0), values.get("bytestostage", 0),
+            speed, min(percent, 100.0),
+        )
+
+    def forget(self, path):
+        """Убираем манифест из кэша (например, приложение удалено)"""
+        self._cache.invalidate(path)
+
+def read_manifest_values(path):
+    """Читаем из appmanifest_*.acf поля верхнего уровня, нужные для прогресса"""
+    values = {}
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        for section, key, value in vdf_extract(f, ManifestProgressTracker.MANIFEST_KEYS):
+            # Нужны только поля верхнего уровня AppState
+            if len(section) != 1:
+                continue
+            key = key.lower()
+            if key in ("appid", "name"):
+                values[key] = value
+            else:
+                values[key] = int(value) if value.isdigit() else 0
+    return values
+
+_manifest_tracker = ManifestProgressTracker()
+
+class AppNameIndex:
+    """Постоянный индекс appid -> название игры.
+
+    Строится из поля "name" манифестов всех библиотек (и названий из логов),
+    обновляется по мере изменения манифестов и хранится небольшой
+    JSON-таблицей, которая загружается при старте. Поиск - один доступ к dict.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(get_cache_dir(), "app_names.json")
+        self._names = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        if self._names is None:
+            data = read_json(self.path)
+            names = {}
+            if isinstance(data, dict) and data.get("version") == self.VERSION:
+                for appid, name in (data.get("names") or {}).items():
+                    if appid.isdigit() and isinstance(name, str):
+                        names[int(appid)] = name
+            self._names = names
+
+    def get(self, appid, default=None):
+        """Название приложения по appid"""
+        with self._lock:
+            self._ensure_loaded()
+            return self._names.get(int(appid), default)
+
+    def update(self, appid, name):
+        """Запоминаем название; возвращаем True, если индекс изменился"""
+        if not name:
+            return False
+        appid = int(appid)
+        with self._lock:
+            self._ensure_loaded()
+            if self._names.get(appid) == name:
+                return False
+            self._names[appid] = name
+            self._dirty = True
+            return True
+
+    def update_from_manifests(self, manifests):
+        """Обновляем индекс по ManifestProgress из сканирования библиотек"""
+        for progress in manifests:
+            if progress.appid.isdigit():
+                self.update(progress.appid, progress.name)
+
+    def save(self):
+        """Сохраняем индекс на диск, если он менялся"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"version": self.VERSION,
+                    "names": {str(appid): name for appid, name in self._names.items()}}
+            self._dirty = False
+        try:
+            write_json_atomic(self.path, data)
+        except OSError as e:
+            print(f"Не удалось сохранить индекс названий игр: {e}")
+            with self._lock:
+                self._dirty = True
+
+_app_names = AppNameIndex()
+
+# Итог сканирования библиотек: manifests - appid -> ManifestProgress,
+# downloading - appid -> библиотека с каталогом steamapps/downloading/<appid>,
+# errors - библиотека -> текст ошибки (например, отключенный диск)
+LibrarySnapshot = namedtuple("LibrarySnapshot", [
+    "libraries", "manifests", "downloading", "errors",
+])
+
+LIBRARY_SCAN_WORKERS = 8
+
+_library_executor = None
+_library_executor_lock = threading.Lock()
+
+def get_library_executor():
+    """Общий пул потоков для сканирования библиотек (создается при первом вызове)"""
+    global _library_executor
+    with _library_executor_lock:
+        if _library_executor is None:
+            _library_executor = ThreadPoolExecutor(
+                max_workers=LIBRARY_SCAN_WORKERS, thread_name_prefix="steam-library")
+        return _library_executor
+
+def scan_library(library, tracker=None):
+    """Сканируем одну библиотеку: appmanifest_*.acf и каталог downloading/"""
+    tracker = tracker or _manifest_tracker
+    steamapps = os.path.join(library, "steamapps")
+    manifests = []
+    with os.scandir(steamapps) as entries:
+        for entry in entries:
+            name = entry.name
+            if not (name.startswith("appmanifest_") and name.endswith(".acf")):
+                continue
+            try:
+                manifests.append(tracker.update(entry.path))
+            except (OSError, ValueError):
+                tracker.forget(entry.path)
+
+    downloading = []
+    try:
+        with os.scandir(os.path.join(steamapps, "downloading")) as entries:
+            downloading = [e.name for e in entries if e.name.isdigit() and e.is_dir()]
+    except OSError:
+        pass
+    return manifests, downloading
+
+def scan_libraries(steam_path, executor=None, libraries=None, tracker=None):
+    """Параллельно сканируем все библиотеки и сводим результат в один LibrarySnapshot.
+
+    Каждая библиотека обычно на своем диске, поэтому общее время определяется
+    самым медленным диском, а не суммой по всем. Список libraries можно
+    передать, если он уже прочитан из libraryfolders.vdf.
+    """
+    if libraries is None:
+        libraries = get_library_folders(steam_path)
+    if len(libraries) == 1:
+        results = [_scan_library_safe(libraries[0], tracker)]
+    else:
+        executor = executor or get_library_executor()
+        results = list(executor.map(lambda library: _scan_library_safe(library, tracker),
+                                    libraries))
+
+    manifests = {}
+    downloading = {}
+    errors = {}
+    for library, (result, error) in zip(libraries, results):
+        if error is not None:
+            errors[library] = error
+            continue
+        library_manifests, library_downloading = result
+        for progress in library_manifests:
+            manifests[progress.appid] = progress
+        for appid in library_downloading:
+            downloading[appid] = library
+    _app_names.update_from_manifests(manifests.values())
+    _app_names.save()
+    return LibrarySnapshot(tuple(libraries), manifests, downloading, errors)
+
+def _scan_library_safe(library, tracker=None):
+    try:
+        return scan_library(library, tracker), None
+    except OSError as e:
+        return None, str(e)
+
+def is_active_download(progress):
+    """Идет или ждет ли обновление приложения по его манифесту"""
+    return bool(progress.state_flags & (APP_STATE_UPDATING | APP_STATE_UPDATE_PAUSED)
+                or progress.bytes_downloaded < progress.bytes_to_download)
+
+def get_stats_paused(steam_path):
+    """Отмечена ли пауза в downloading_stats.txt (файла может не быть)"""
     stats_file = os.path.join(steam_path, "config", "downloading_stats.txt")
     if os.path.exists(stats_file):
         try:
-            with open(stats_file, 'r') as f:
-                stats = f.read()
-                if "paused" in stats.lower():
-                    return "пауза", 0
+            return _file_cache.get(stats_file, read_stats_paused)
         except:
             pass
-    
-    # Проверяем лог загрузок
-    content_log = os.path.join(logs_dir, "content_log.txt")
-    if os.path.exists(content_log):
-        try:
-            with open(content_log, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-                if "paused" in content.lower() or "suspend" in content.lower():
-                    return "пауза", 0
-        except:
-            pass
-    
-    # Проверяем наличие активных загрузок через библиотеки
-    library_folders_path = os.path.join(steam_path, "steamapps", "libraryfolders.vdf")
+    return False
+
+def get_library_download_state(library_folders_path):
+    """(активна ли загрузка, байт/с) по libraryfolders.vdf; (False, 0), если прочитать не вышло"""
     if os.path.exists(library_folders_path):
         try:
-            with open(library_folders_path, 'r') as f:
-                content = f.read()
-                # Если есть активные загрузки, будут упоминания о downloading
-                if '"downloading"' in content and '"1"' in content:
-                    # Пробуем извлечь скорость
-                    speed_match = re.search(r'"bytespersecond"\s+"(\d+)"', content)
-                    if speed_match:
-                        speed_bytes = int(speed_match.group(1))
-                        return "активно", speed_bytes
-                    return "активно", 0
+            return _file_cache.get(library_folders_path, read_library_download_state)
         except:
             pass
+    return False, 0
+
+def resolve_download_status(session_status, library_state, manifests, disk_speed):
+    """Сводим источники в (статус, байт/с).
+
+    Приоритет: пауза по логу, затем libraryfolders.vdf, затем манифесты
+    (там Steam хранит реальный прогресс), и только потом рост файлов на диске.
+    """
+    if session_status == "пауза":
+        return "пауза", 0
+    
+    active, speed_bytes = library_state
+    if active:
+        return "активно", speed_bytes
+    
+    running = [p for p in manifests
+               if p.state_flags & APP_STATE_UPDATING
+               and not p.state_flags & APP_STATE_UPDATE_PAUSED]
+    if running:
+        return "активно", int(sum(p.speed for p in running))
+    
+    if session_status == "активно":
+        return "активно", int(disk_speed)
     
     return "неактивно", 0
 
+def get_download_status(steam_path):
+    """Получаем статус загрузки: (статус, байт/с).
+
+    Источники опрашиваются без бюджета времени, так что первый вызов ждет
+    разбора всего лога. Скорость по росту файлов на диске считается между
+    вызовами, поэтому при первом вызове она еще не известна.
+    """
+    snapshot = get_default_registry().collect(steam_path, names=("logs", "libraries", "disk"),
+                                              wait=True)
+    state = resolve_snapshot(snapshot)
+    return state.status, state.speed
+
+CHECKPOINT_VERSION = 1
+# Не чаще одного сохранения контрольной точки за столько секунд
+CHECKPOINT_INTERVAL = 10
+# Сколько секунд при выходе ждать разбор лога, чтобы сохранить контрольную точку
+FINAL_CHECKPOINT_WAIT = 60
+
+# Путь Steam -> monotonic-время последнего сохранения его контрольной точки
+_last_checkpoint = {}
+
+def get_checkpoint_path(steam_path):
+    """Файл контрольной точки для конкретной установки Steam"""
+    key = zlib.crc32(os.path.normcase(os.path.abspath(steam_path)).encode('utf-8'))
+    return os.path.join(get_cache_dir(), f"checkpoint-{key:08x}.json")
+
+def save_checkpoint(steam_path, tailer=None, sessions=None):
+    """Атомарно сохраняем смещения логов и состояния загрузок"""
+    tailer = tailer or _content_log_tailer
+    sessions = sessions or _download_sessions
+    data = {
+        "version": CHECKPOINT_VERSION,
+        "steam_path": steam_path,
+        "tailer": tailer.to_state(),
+        "sessions": sessions.to_state(),
+    }
+    write_json_atomic(get_checkpoint_path(steam_path), data)
+    _last_checkpoint[steam_path] = time.monotonic()
+
+def maybe_save_checkpoint(steam_path, min_interval=CHECKPOINT_INTERVAL, tailer=None, sessions=None):
+    """Сохраняем контрольную точку, если с прошлого сохранения прошло min_interval секунд"""
+    last = _last_checkpoint.get(steam_path)
+    if last is not None and time.monotonic() - last < min_interval:
+        return
+    save_checkpoint_quietly(steam_path, tailer, sessions)
+
+def save_checkpoint_quietly(steam_path, tailer=None, sessions=None):
+    """Сохраняем контрольную точку, не падая из-за ошибок записи"""
+    try:
+        save_checkpoint(steam_path, tailer, sessions)
+    except OSError as e:
+        print(f"Не удалось сохранить контрольную точку {steam_path}: {e}")
+
+def load_checkpoint(steam_path, tailer=None, sessions=None):
+    """Восстанавливаемся из контрольной точки; True, если продолжаем чтение лога с места остановки"""
+    tailer = tailer or _content_log_tailer
+    sessions = sessions or _download_sessions
+    data = read_json(get_checkpoint_path(steam_path))
+    if not isinstance(data, dict) or data.get("version") != CHECKPOINT_VERSION:
+        return False
+    try:
+        restored = tailer.restore(data.get("tailer") or {})
+        # Состояния загрузок верны только вместе со смещением content_log,
+        # из которого они получены
+        content_log = os.path.join(steam_path, "logs", "content_log.txt")
+        if content_log not in restored:
+            tailer.forget(content_log)
+            return False
+        sessions.restore(data.get("sessions") or {})
+    except (AttributeError, TypeError, ValueError):
+        return False
+    return True
+
+# Элемент очереди загрузок: state - одно из SESSION_STATES, speed - байт/с
+QueueItem = namedtuple("QueueItem", [
+    "appid", "name", "state", "bytes_done", "bytes_total", "speed", "percent",
+])
+
+# Порядок вывода очереди: сначала то, что качается сейчас
+_QUEUE_ORDER = {state: index for index, state in enumerate(
+    SESSION_ACTIVE_STATES + (SESSION_PAUSED, SESSION_QUEUED, SESSION_FINISHED))}
+
+def manifest_session_state(progress):
+    """Состояние загрузки по флагам appmanifest, когда в логе о приложении ничего нет"""
+    if progress.state_flags & APP_STATE_UPDATE_PAUSED:
+        return SESSION_PAUSED
+    if progress.state_flags & APP_STATE_UPDATING:
+        if progress.bytes_to_download and progress.bytes_downloaded >= progress.bytes_to_download:
+            return SESSION_STAGING
+        return SESSION_DOWNLOADING
+    if progress.bytes_downloaded < progress.bytes_to_download:
+        return SESSION_QUEUED
+    return SESSION_FINISHED
+
+def build_download_queue(snapshot, sessions, disk_speed=None):
+    """Очередь загрузок из LibrarySnapshot и состояний сессий (appid -> состояние).
+
+    disk_speed(appid) - скорость роста файлов приложения на диске; ею
+    подменяется скорость, если манифест ее не дал.
+    """
+    disk_speed = disk_speed or _disk_growth.speed
+    manifests = {int(appid): progress for appid, progress in snapshot.manifests.items()
+                 if appid.isdigit()}
+
+    appids = set(sessions)
+    appids.update(int(appid) for appid in snapshot.downloading if appid.isdigit())
+    appids.update(appid for appid, progress in manifests.items()
+                  if manifest_session_state(progress) != SESSION_FINISHED)
+
+    queue = []
+    for appid in appids:
+        progress = manifests.get(appid)
+        state = sessions.get(appid)
+        if state is None:
+            state = manifest_session_state(progress) if progress else SESSION_QUEUED
+        if progress is None:
+            queue.append(QueueItem(appid, _app_names.get(appid, ""), state, 0, 0, 0.0, 0.0))
+        else:
+            # Если манифест скорости не дал, берем рост файлов загрузки на диске
+            queue.append(QueueItem(appid, progress.name or _app_names.get(appid, ""), state,
+                                   progress.bytes_downloaded, progress.bytes_to_download,
+                                   progress.speed or disk_speed(appid),
+                                   progress.percent))
+    queue.sort(key=lambda item: (_QUEUE_ORDER[item.state], item.appid))
+    return queue
+
+def update_download_sessions(content_log, sessions=None, tailer=None):
+    """Скармливаем автомату состояний события, дописанные в лог с прошлого вызова"""
+    sessions = sessions or _download_sessions
+    tailer = tailer or _content_log_tailer
+    reset, start, end = tailer.pending_range(content_log)
+    if reset:
+        sessions.reset()
+    if not tailer.rotation_pending(content_log):
+        if end <= start:
+            return
+        # Если в новых байтах нет ни одной метки события, строки не декодируем
+        found, scanned_end = mmap_scan_any(content_log, CONTENT_EVENT_MARKERS, start, end)
+        if not found:
+            tailer.commit(content_log, scanned_end)
+            return
+    # Хвост ротированного лога и начало нового идут одним потоком
+    _, lines = tailer.poll(content_log)
+    for event in parse_content_log(lines):
+        sessions.feed(event)
+        if isinstance(event, AppUpdateStart) and event.name:
+            _app_names.update(event.appid, event.name)
+
 def format_speed(bytes_per_second):
     """Форматируем скорость в читаемый вид"""
     if bytes_per_second == 0:
@@ -125,8 +1634,1086 @@ def format_speed(bytes_per_second):
         bytes_per_second /= 1024
     return f"{bytes_per_second:.2f} TB/s"
 
-def monitor_steam_downloads():
-    """Основная функция мониторинга"""
+def format_size(size_bytes):
+    """Форматируем размер в читаемый вид"""
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size_bytes < 1024:
+            return f"{size_bytes:.2f} {unit}"
+        size_bytes /= 1024
+    return f"{size_bytes:.2f} TB"
+
+class SpeedSampleBuffer:
+    """Кольцевой буфер замеров (monotonic-время, байт скачано, байт на диске).
+
+    Хранится в массивах array фиксированной емкости, поэтому память не растет
+    сколько бы ни работал мониторинг. Добавление - O(1), запросы по окну -
+    O(число замеров в окне).
+    """
+
+    DOWNLOADED = 0
+    ON_DISK = 1
+
+    def __init__(self, capacity=36000):
+        # По умолчанию - час истории при 10 замерах в секунду
+        if capacity < 2:
+            raise ValueError("Емкость буфера должна быть не меньше 2")
+        self.capacity = capacity
+        self._timestamps = array('d', bytes(8 * capacity))
+        self._counters = (array('q', bytes(8 * capacity)),
+                          array('q', bytes(8 * capacity)))
+        self._start = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, timestamp, downloaded, on_disk):
+        """Добавляем замер; при заполнении затирается самый старый"""
+        index = (self._start + self._count) % self.capacity
+        if self._count == self.capacity:
+            self._start = (self._start + 1) % self.capacity
+        else:
+            self._count += 1
+        self._timestamps[index] = timestamp
+        self._counters[self.DOWNLOADED][index] = downloaded
+        self._counters[self.ON_DISK][index] = on_disk
+
+    def latest(self):
+        """Последний замер (время, скачано, на диске) или None"""
+        if not self._count:
+            return None
+        index = (self._start + self._count - 1) % self.capacity
+        return (self._timestamps[index],
+                self._counters[self.DOWNLOADED][index],
+                self._counters[self.ON_DISK][index])
+
+    def _window_indexes(self, seconds):
+        """Индексы замеров за последние seconds секунд, от старых к новым"""
+        if not self._count:
+            return []
+        last = (self._start + self._count - 1) % self.capacity
+        since = self._timestamps[last] - seconds
+        indexes = []
+        for offset in range(self._count - 1, -1, -1):
+            index = (self._start + offset) % self.capacity
+            if self._timestamps[index] < since:
+                break
+            indexes.append(index)
+        indexes.reverse()
+        return indexes
+
+    def _rates(self, seconds, field):
+        counters = self._counters[field]
+        indexes = self._window_indexes(seconds)
+        rates = []
+        for prev, cur in zip(indexes, indexes[1:]):
+            elapsed = self._timestamps[cur] - self._timestamps[prev]
+            if elapsed > 0:
+                rates.append(max(0, counters[cur] - counters[prev]) / elapsed)
+        return rates
+
+    def average_rate(self, seconds, field=DOWNLOADED):
+        """Средняя скорость (байт/с) за окно: прирост, деленный на длительность"""
+        indexes = self._window_indexes(seconds)
+        if len(indexes) < 2:
+            return 0.0
+        first, last = indexes[0], indexes[-1]
+        elapsed = self._timestamps[last] - self._timestamps[first]
+        if elapsed <= 0:
+            return 0.0
+        counters = self._counters[field]
+        return max(0, counters[last] - counters[first]) / elapsed
+
+    def min_rate(self, seconds, field=DOWNLOADED):
+        """Минимальная скорость между соседними замерами в окне"""
+        return min(self._rates(seconds, field), default=0.0)
+
+    def max_rate(self, seconds, field=DOWNLOADED):
+        """Максимальная скорость между соседними замерами в окне"""
+        return max(self._rates(seconds, field), default=0.0)
+
+_speed_history = SpeedSampleBuffer()
+
+# Файлы, изменение которых может поменять статус загрузки
+RELEVANT_FILE_PATTERNS = (
+    "content_log*.txt",
+    "downloading_stats.txt",
+    "libraryfolders.vdf",
+    "appmanifest_*.acf",
+)
+
+def is_relevant_file(name):
+    """Проверяем, влияет ли файл с таким именем на статус загрузки"""
+    return any(fnmatch.fnmatch(name, pattern) for pattern in RELEVANT_FILE_PATTERNS)
+
+def get_watch_dirs(steam_path):
+    """Каталоги для наблюдения: logs/, config/ и steamapps/ каждой библиотеки"""
+    dirs = [os.path.join(steam_path, "logs"), os.path.join(steam_path, "config")]
+    for library in get_library_folders(steam_path):
+        dirs.append(os.path.join(library, "steamapps"))
+    return [d for d in dirs if os.path.isdir(d)]
+
+class PollingWatcher:
+    """Запасной вариант без inotify: просто ждем таймаут"""
+
+    def watch(self, path):
+        pass
+
+    def wait(self, timeout):
+        """Возвращаем None - изменения неизвестны, статус нужно пересчитать"""
+        time.sleep(timeout)
+        return None
+
+    def close(self):
+        pass
+
+class InotifyWatcher:
+    """Наблюдение за каталогами через inotify (Linux, через ctypes)"""
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+                  | IN_CREATE | IN_DELETE)
+    EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6",
+                                 use_errno=True)
+        self._fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._ctypes = ctypes
+        self._dirs = {}
+
+    def watch(self, path):
+        """Добавляем каталог в наблюдение (повторный вызов безопасен)"""
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path),
+                                          self.WATCH_MASK)
+        if wd < 0:
+            raise OSError(self._ctypes.get_errno(), "inotify_add_watch failed", path)
+        self._dirs[wd] = path
+
+    def wait(self, timeout):
+        """Ждем события; возвращаем список измененных путей или None при переполнении"""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+
+        changed = []
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = self.EVENT_HEADER.unpack_from(data, offset)
+                offset += self.EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if mask & self.IN_Q_OVERFLOW:
+                    return None
+                if wd in self._dirs and name:
+                    changed.append(os.path.join(self._dirs[wd], os.fsdecode(name)))
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+def watch_dirs(watcher, dirs):
+    """Добавляем каталоги в наблюдение; недоступные (например, отключенный диск) пропускаем.
+
+    Возвращаем число каталогов, которые удалось добавить.
+    """
+    watched = 0
+    for path in dirs:
+        try:
+            watcher.watch(path)
+            watched += 1
+        except OSError as e:
+            print(f"Не удалось наблюдать за {path}: {e}")
+    return watched
+
+def create_watcher(dirs):
+    """Создаем inotify-наблюдатель, а если он недоступен - опрос по таймауту"""
+    if sys.platform.startswith("linux"):
+        try:
+            watcher = InotifyWatcher()
+        except (OSError, AttributeError) as e:
+            print(f"inotify недоступен, используем опрос: {e}")
+            return PollingWatcher()
+        if watch_dirs(watcher, dirs) or not dirs:
+            return watcher
+        watcher.close()
+        print("inotify не смог наблюдать ни за одним каталогом, используем опрос")
+    return PollingWatcher()
+
+# Замер роста файлов на диске: total - байт во всех каталогах загрузки,
+# per_app - appid -> байт, speed/per_app_speed - байт/с с прошлого замера
+DiskGrowthSample = namedtuple("DiskGrowthSample", [
+    "timestamp", "total", "per_app", "speed", "per_app_speed",
+])
+
+class DiskGrowthSampler:
+    """Скорость записи по росту steamapps/downloading/<appid> и steamapps/temp/<appid>.
+
+    Размеры кэшируются по каталогам с ключом по mtime каталога: каталог,
+    в котором не появлялись и не удалялись файлы, заново не листается.
+    В нем перепроверяются только "горячие" файлы - те, что менялись за
+    последние HOT_SECONDS, - так что замер дешев и на депо в 100k файлов.
+
+    Рост остывшего файла виден только при перелистывании каталога (не
+    реже раза в FULL_RESCAN_SECONDS), и до него скорость занижена. Найденные
+    байты набежали за все время с прошлого листинга, поэтому в скорость они
+    попадают равномерно за такой же срок, начиная с текущего замера: выброса
+    нет, и ни один байт не теряется.
+    """
+
+    # Сколько секунд файл должен не меняться, чтобы перестать быть горячим
+    HOT_SECONDS = 5.0
+    # Раз в столько секунд перелистываем все каталоги: остывший файл мог
+    # снова начать расти, не меняя mtime своего каталога
+    FULL_RESCAN_SECONDS = 30.0
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        # каталог -> [mtime_ns, {файл: размер}, [подкаталоги],
+        #             {горячий файл: время последнего изменения}, время листинга]
+        self._dirs = {}
+        self._last = None
+        self._last_full_rescan = None
+        # appid -> [[скорость, начало, конец], ...] - догоняющий рост остывших
+        # файлов, который еще разносится по замерам
+        self._backlog = {}
+
+    def sample(self, steam_path, libraries=None):
+        """Снимаем замер по всем библиотекам (libraries - уже прочитанный их список)"""
+        if libraries is None:
+            libraries = get_library_folders(steam_path)
+        now = self._clock()
+        full_rescan = (self._last_full_rescan is None
+                       or now - self._last_full_rescan >= self.FULL_RESCAN_SECONDS)
+        if full_rescan:
+            self._last_full_rescan = now
+        per_app = {}
+        # appid -> [байт догоняющего роста остывших файлов, [(скорость, срок), ...]]
+        caught_up = {}
+        seen = set()
+        for library in libraries:
+            steamapps = os.path.join(library, "steamapps")
+            for area in ("downloading", "temp"):
+                area_path = os.path.join(steamapps, area)
+                try:
+                    with os.scandir(area_path) as entries:
+                        app_dirs = [e for e in entries if e.name.isdigit() and e.is_dir()]
+                except OSError:
+                    continue
+                for entry in app_dirs:
+                    size, caught_bytes, caught_spread = self._tree_size(
+                        entry.path, seen, now, full_rescan)
+                    appid = int(entry.name)
+                    per_app[appid] = per_app.get(appid, 0) + size
+                    if caught_bytes:
+                        app_caught = caught_up.setdefault(appid, [0, []])
+                        app_caught[0] += caught_bytes
+                        app_caught[1].extend(caught_spread)
+
+        # Каталоги, которых больше нет (загрузка завершена), убираем из кэша
+        for path in [p for p in self._dirs if p not in seen]:
+            del self._dirs[path]
+
+        # Догоняющий рост разносим по замерам, начиная с текущего интервала
+        start = self._last.timestamp if self._last is not None else now
+        for appid, (_, spread) in caught_up.items():
+            self._backlog.setdefault(appid, []).extend(
+                [rate, start, start + span] for rate, span in spread)
+        for appid in [a for a in self._backlog if a not in per_app]:
+            del self._backlog[appid]
+
+        total = sum(per_app.values())
+        speed = 0.0
+        per_app_speed = {}
+        if self._last is not None and now > self._last.timestamp:
+            elapsed = now - self._last.timestamp
+            for appid, size in per_app.items():
+                previous = self._last.per_app.get(appid, size)
+                caught_bytes = caught_up[appid][0] if appid in caught_up else 0
+                growth = max(0, size - previous - caught_bytes)
+                per_app_speed[appid] = (growth + self._drain_backlog(appid, start, now)) / elapsed
+            speed = sum(per_app_speed.values())
+        self._last = DiskGrowthSample(now, total, per_app, speed, per_app_speed)
+        return self._last
+
+    def _drain_backlog(self, appid, start, end):
+        """Байты догоняющего роста приложения, приходящиеся на интервал [start, end]"""
+        entries = self._backlog.get(appid)
+        if not entries:
+            return 0.0
+        drained = 0.0
+        for rate, spread_start, spread_end in entries:
+            overlap = min(end, spread_end) - max(start, spread_start)
+            if overlap > 0:
+                drained += rate * overlap
+        entries[:] = [e for e in entries if e[2] > end]
+        if not entries:
+            del self._backlog[appid]
+        return drained
+
+    def speed(self, appid=None):
+        """Скорость записи по последнему замеру: общая или для одного приложения"""
+        if self._last is None:
+            return 0.0
+        if appid is None:
+            return self._last.speed
+        return self._last.per_app_speed.get(appid, 0.0)
+
+    def _tree_size(self, path, seen, now, full_rescan=False):
+        """Размер файлов в дереве, перелистывая только измененные каталоги.
+
+        Возвращаем (байт, догоняющий рост остывших файлов, [(его скорость, срок), ...]).
+        """
+        total = 0
+        caught_bytes = 0
+        caught_spread = []
+        stack = [path]
+        while stack:
+            directory = stack.pop()
+            try:
+                mtime = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue
+            seen.add(directory)
+            cached = self._dirs.get(directory)
+            if cached is None or cached[0] != mtime or full_rescan:
+                listed = self._list_dir(directory, mtime, cached, now)
+                if listed is None:
+                    continue
+                cached, dir_caught_bytes, dir_caught_span = listed
+                if dir_caught_bytes:
+                    caught_bytes += dir_caught_bytes
+                    caught_spread.append((dir_caught_bytes / dir_caught_span, dir_caught_span))
+                self._dirs[directory] = cached
+            else:
+                self._refresh_hot_files(directory, cached, now)
+            total += sum(cached[1].values())
+            stack.extend(cached[2])
+        return total, caught_bytes, caught_spread
+
+    def _list_dir(self, directory, mtime, previous, now):
+        files = {}
+        subdirs = []
+        hot = {}
+        old_files = previous[1] if previous is not None else {}
+        old_hot = previous[3] if previous is not None else {}
+        # Рост остывшего файла мог произойти в любой момент с прошлого листинга
+        span = now - previous[4] if previous is not None else 0.0
+        caught_bytes = 0
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            size = entry.stat(follow_symlinks=False).st_size
+                            files[entry.name] = size
+                            old_size = old_files.get(entry.name)
+                            if old_size != size:
+                                hot[entry.name] = now
+                                if old_size is not None and entry.name not in old_hot:
+                                    caught_bytes += max(0, size - old_size)
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+        # Файлы, которые уже были горячими, продолжаем отслеживать
+        for name, changed_at in old_hot.items():
+            if name in files and name not in hot:
+                hot[name] = changed_at
+        if span <= 0:
+            caught_bytes = 0
+        return [mtime, files, subdirs, hot, now], caught_bytes, span
+
+    def _refresh_hot_files(self, directory, cached, now):
+        files, hot = cached[1], cached[3]
+        for name in list(hot):
+            try:
+                size = os.stat(os.path.join(directory, name)).st_size
+            except OSError:
+                # Удаление файла меняет mtime каталога, тут это гонка - просто забываем
+                files.pop(name, None)
+                del hot[name]
+                continue
+            if size != files.get(name):
+                files[name] = size
+                hot[name] = now
+            elif now - hot[name] >= self.HOT_SECONDS:
+                del hot[name]
+
+_disk_growth = DiskGrowthSampler()
+
+# Замер ввода-вывода процессов Steam: суммарные счетчики и скорости, байт/с
+ProcIOSample = namedtuple("ProcIOSample", [
+    "timestamp", "pids", "read_bytes", "write_bytes", "rchar", "wchar",
+    "read_rate", "write_rate",
+])
+
+class ProcIOSampler:
+    """Скорость дискового ввода-вывода дерева процессов Steam по /proc/<pid>/io (Linux).
+
+    PID процессов ищутся один раз и кэшируются; /proc перебирается заново
+    только когда один из закэшированных процессов завершился. Пока Steam
+    не запущен, поиск повторяется не чаще раза в SEARCH_INTERVAL секунд.
+    """
+
+    # Имена корневых процессов (comm), чье дерево считаем процессами Steam
+    STEAM_PROCESS_NAMES = ("steam", "steamcmd")
+    IO_FIELDS = ("read_bytes", "write_bytes", "rchar", "wchar")
+    # Как часто искать процессы, пока Steam не найден, с
+    SEARCH_INTERVAL = 5.0
+
+    def __init__(self, proc_root="/proc", clock=time.monotonic):
+        self.proc_root = proc_root
+        self._clock = clock
+        self._pids = None
+        self._last = None
+        self._next_search = None
+
+    @staticmethod
+    def is_available(proc_root="/proc"):
+        return sys.platform.startswith("linux") and os.path.isdir(proc_root)
+
+    def find_steam_pids(self):
+        """Перебираем /proc: корневые процессы Steam и все их потомки"""
+        parents = {}
+        roots = []
+        try:
+            names = os.listdir(self.proc_root)
+        except OSError:
+            return ()
+        for name in names:
+            if not name.isdigit():
+                continue
+            try:
+                with open(os.path.join(self.proc_root, name, "stat"), 'r') as f:
+                    stat = f.read()
+            except OSError:
+                continue
+            # Формат: pid (comm) state ppid ...; comm может содержать пробелы и скобки
+            comm_end = stat.rfind(')')
+            comm = stat[stat.find('(') + 1:comm_end]
+            fields = stat[comm_end + 2:].split()
+            pid = int(name)
+            parents[pid] = int(fields[1]) if len(fields) > 1 else 0
+            if comm in self.STEAM_PROCESS_NAMES:
+                roots.append(pid)
+
+        tree = set(roots)
+        changed = True
+        while changed:
+            changed = False
+            for pid, ppid in parents.items():
+                if ppid in tree and pid not in tree:
+                    tree.add(pid)
+                    changed = True
+        return tuple(sorted(tree))
+
+    def _read_io(self, pid):
+        counters = {}
+        with open(os.path.join(self.proc_root, str(pid), "io"), 'r') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in self.IO_FIELDS:
+                    counters[key] = int(value)
+        return counters
+
+    def sample(self):
+        """Снимаем замер; None, если процессы Steam не найдены"""
+        # Пустой список - Steam еще не запущен: ищем процессы, но не на каждом замере
+        if not self._pids:
+            if self._next_search is not None and self._clock() < self._next_search:
+                return None
+            self._pids = self._search_pids()
+        totals = self._read_totals(self._pids)
+        if totals is None:
+            # Процесс завершился - один раз перестраиваем список PID
+            self._pids = self._search_pids()
+            totals = self._read_totals(self._pids)
+            self._last = None
+        if totals is None or not self._pids:
+            self._last = None
+            return None
+
+        now = self._clock()
+        read_rate = write_rate = 0.0
+        # Скорость считаем только по тому же набору процессов
+        if self._last is not None and self._last.pids == self._pids and now > self._last.timestamp:
+            elapsed = now - self._last.timestamp
+            read_rate = max(0, totals["read_bytes"] - self._last.read_bytes) / elapsed
+            write_rate = max(0, totals["write_bytes"] - self._last.write_bytes) / elapsed
+        self._last = ProcIOSample(now, self._pids, totals["read_bytes"], totals["write_bytes"],
+                                  totals["rchar"], totals["wchar"], read_rate, write_rate)
+        return self._last
+
+    def _search_pids(self):
+        pids = self.find_steam_pids()
+        self._next_search = None if pids else self._clock() + self.SEARCH_INTERVAL
+        return pids
+
+    def _read_totals(self, pids):
+        totals = dict.fromkeys(self.IO_FIELDS, 0)
+        for pid in pids:
+            try:
+                counters = self._read_io(pid)
+            except FileNotFoundError:
+                return None
+            except (PermissionError, ProcessLookupError):
+                # /proc/<pid>/io чужого пользователя недоступен
+                continue
+            except OSError:
+                return None
+            for key, value in counters.items():
+                totals[key] += value
+        return totals
+
+_proc_io = ProcIOSampler() if ProcIOSampler.is_available() else None
+
+# Замер сетевого интерфейса: счетчики из /proc/net/dev и скорости, байт/с
+NetDevSample = namedtuple("NetDevSample", [
+    "timestamp", "interface", "rx_bytes", "tx_bytes", "rx_rate", "tx_rate",
+])
+
+class NetDevSampler:
+    """Входящий/исходящий трафик интерфейса по счетчикам /proc/net/dev (Linux)"""
+
+    def __init__(self, interface, path="/proc/net/dev", clock=time.monotonic):
+        self.interface = interface
+        self.path = path
+        self._clock = clock
+        self._last = None
+
+    def read_counters(self):
+        """Текущие (rx_bytes, tx_bytes) интерфейса"""
+        with open(self.path, 'r') as f:
+            for line in f:
+                name, sep, data = line.partition(':')
+                if sep and name.strip() == self.interface:
+                    fields = data.split()
+                    # Поля: 8 счетчиков приема, затем 8 счетчиков передачи
+                    return int(fields[0]), int(fields[8])
+        raise ValueError(f"Интерфейс {self.interface} не найден в {self.path}")
+
+    @staticmethod
+    def counter_delta(old, new):
+        """Прирост счетчика с учетом переполнения 32- или 64-битного значения.
+
+        Уменьшение считаем переполнением, только если старое значение было
+        близко к границе счетчика (прирост через переполнение меньше половины
+        его диапазона). Иначе это сброс счетчика (интерфейс подняли заново),
+        и приростом считается новое значение.
+        """
+        if new >= old:
+            return new - old
+        for modulus in (1 << 32, 1 << 64):
+            if old < modulus:
+                wrapped = new + modulus - old
+                if wrapped < modulus // 2:
+                    return wrapped
+        return new
+
+    def sample(self):
+        """Снимаем замер; скорости считаются от предыдущего замера"""
+        rx, tx = self.read_counters()
+        now = self._clock()
+        rx_rate = tx_rate = 0.0
+        if self._last is not None and now > self._last.timestamp:
+            elapsed = now - self._last.timestamp
+            rx_rate = self.counter_delta(self._last.rx_bytes, rx) / elapsed
+            tx_rate = self.counter_delta(self._last.tx_bytes, tx) / elapsed
+        self._last = NetDevSample(now, self.interface, rx, tx, rx_rate, tx_rate)
+        return self._last
+
+_net_dev = None
+
+def configure_network_sampler(interface):
+    """Включаем замер трафика интерфейса; ValueError/OSError, если он недоступен"""
+    global _net_dev, _default_registry
+    sampler = NetDevSampler(interface)
+    sampler.sample()
+    _net_dev = sampler
+    # Реестр по умолчанию пересоздается уже с замером сети
+    _default_registry = None
+
+# Общие для всех сэмплеров данные тика: пути и список библиотек вычисляются
+# один раз, а не в каждом источнике
+TickContext = namedtuple("TickContext", [
+    "steam_path", "logs_dir", "content_log", "library_folders_path", "libraries",
+])
+
+def make_tick_context(steam_path):
+    logs_dir = os.path.join(steam_path, "logs")
+    return TickContext(steam_path, logs_dir, os.path.join(logs_dir, "content_log.txt"),
+                       os.path.join(steam_path, "steamapps", "libraryfolders.vdf"),
+                       tuple(get_library_folders(steam_path)))
+
+class Sampler:
+    """Источник данных для снимка состояния.
+
+    name - ключ результата в снимке, budget - сколько секунд тик ждет
+    результата. sample(context) выполняется в пуле потоков; новый вызов
+    не начинается, пока не закончился предыдущий, поэтому собственное
+    состояние сэмплера блокировок не требует.
+    """
+
+    name = None
+    budget = 5.0
+
+    def sample(self, context):
+        raise NotImplementedError
+
+class CallableSampler(Sampler):
+    """Сэмплер из функции func(context)"""
+
+    def __init__(self, name, func, budget=None):
+        self.name = name
+        self._func = func
+        if budget is not None:
+            self.budget = budget
+
+    def sample(self, context):
+        return self._func(context)
+
+# Результат сэмплера логов: sessions - appid -> состояние незавершенных загрузок
+LogSample = namedtuple("LogSample", [
+    "logs_found", "stats_paused", "session_status", "sessions", "game_name",
+])
+
+class LogSampler(Sampler):
+    """Новые события content_log, пауза из downloading_stats.txt и название игры из логов"""
+
+    name = "logs"
+
+    def __init__(self, sessions=None, tailer=None):
+        self.sessions = sessions or _download_sessions
+        self.tailer = tailer or _content_log_tailer
+
+    def sample(self, context):
+        if not os.path.isdir(context.logs_dir):
+            return LogSample(False, False, "неактивно", {}, None)
+        stats_paused = get_stats_paused(context.steam_path)
+        if os.path.exists(context.content_log):
+            try:
+                update_download_sessions(context.content_log, self.sessions, self.tailer)
+            except Exception:
+                self.tailer.forget(context.content_log)
+        try:
+            game_name = find_game_name_in_logs(context.logs_dir)
+        except OSError:
+            game_name = None
+        return LogSample(True, stats_paused, self.sessions.overall_status(),
+                         self.sessions.unfinished(), game_name)
+
+# Результат сэмплера библиотек: LibrarySnapshot и состояние из libraryfolders.vdf
+LibrarySample = namedtuple("LibrarySample", ["snapshot", "download_state"])
+
+class LibrarySampler(Sampler):
+    """Манифесты и каталоги загрузки всех библиотек"""
+
+    name = "libraries"
+    budget = 10.0
+
+    def __init__(self, tracker=None):
+        self.tracker = tracker
+
+    def sample(self, context):
+        snapshot = scan_libraries(context.steam_path, libraries=context.libraries,
+                                  tracker=self.tracker)
+        return LibrarySample(snapshot, get_library_download_state(context.library_folders_path))
+
+# Снимок одного тика: values - имя сэмплера -> результат, errors - имя -> текст
+# ошибки (в том числе превышение бюджета), durations - имя -> секунды работы.
+# Словари только для чтения: снимок можно отдавать другим потокам как есть
+SamplerSnapshot = namedtuple("SamplerSnapshot", [
+    "timestamp", "steam_path", "values", "errors", "durations",
+])
+
+SAMPLER_WORKERS = 8
+
+_sampler_executor = None
+_sampler_executor_lock = threading.Lock()
+
+def get_sampler_executor():
+    """Общий пул потоков для сэмплеров (создается при первом вызове)"""
+    global _sampler_executor
+    with _sampler_executor_lock:
+        if _sampler_executor is None:
+            _sampler_executor = ThreadPoolExecutor(
+                max_workers=SAMPLER_WORKERS, thread_name_prefix="steam-sampler")
+        return _sampler_executor
+
+class SamplerRegistry:
+    """Набор сэмплеров, которые на каждом тике выполняются параллельно.
+
+    Каждому сэмплеру отводится свой бюджет времени от начала тика: если он
+    не успел, его результат в снимок не попадает, а медленный диск не
+    задерживает остальные источники. Зависший сэмплер не перезапускается,
+    пока не закончится предыдущий вызов.
+    """
+
+    def __init__(self, executor=None, clock=time.monotonic):
+        self._samplers = OrderedDict()
+        # имя -> future вызова, не уложившегося в бюджет
+        self._running = {}
+        self._executor = executor
+        self._clock = clock
+
+    def register(self, sampler):
+        if not sampler.name:
+            raise ValueError("У сэмплера должно быть имя")
+        if sampler.name in self._samplers:
+            raise ValueError(f"Сэмплер {sampler.name} уже зарегистрирован")
+        self._samplers[sampler.name] = sampler
+        return sampler
+
+    def unregister(self, name):
+        self._samplers.pop(name, None)
+        self._running.pop(name, None)
+
+    def names(self):
+        return list(self._samplers)
+
+    def busy(self, name):
+        """Выполняется ли еще вызов сэмплера с прошлого тика"""
+        future = self._running.get(name)
+        return future is not None and not future.done()
+
+    def wait_idle(self, name, timeout=None):
+        """Ждем вызов сэмплера, не уложившийся в бюджет collect; True, если сэмплер свободен"""
+        future = self._running.get(name)
+        if future is not None:
+            futures_wait([future], timeout)
+        return not self.busy(name)
+
+    def collect(self, steam_path, names=None, context=None, wait=False):
+        """Запускаем сэмплеры (все или только names) и собираем SamplerSnapshot.
+
+        wait=True - ждем каждый сэмплер до конца, не ограничивая его бюджетом.
+        """
+        context = context or make_tick_context(steam_path)
+        executor = self._executor or get_sampler_executor()
+        started = self._clock()
+        errors = {}
+        futures = {sampler.name: executor.submit(self._run, sampler, context)
+                   for sampler in self._due(names, errors)}
+
+        outcomes = {}
+        try:
+            for name, future in futures.items():
+                try:
+                    outcomes[name] = future.result(
+                        None if wait else self._remaining(name, started))
+                except Exception as e:
+                    outcomes[name] = e
+        except BaseException:
+            # Ctrl+C во время ожидания: вызовы дорабатывают в пуле
+            self._abandon(futures)
+            raise
+        return self._snapshot(context, futures, outcomes, errors)
+
+    async def collect_async(self, steam_path, names=None, context=None):
+        """То же, что collect, но без блокировки цикла событий asyncio.
+
+        Блокирующий ввод-вывод сэмплеров выполняется в пуле потоков реестра,
+        корутина только ждет результатов с учетом бюджетов.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._executor or get_sampler_executor()
+        if context is None:
+            context = await loop.run_in_executor(executor, make_tick_context, steam_path)
+        started = self._clock()
+        errors = {}
+        futures = {sampler.name: loop.run_in_executor(executor, self._run, sampler, context)
+                   for sampler in self._due(names, errors)}
+
+        outcomes = {}
+        try:
+            for name, future in futures.items():
+                try:
+                    # shield: по таймауту вызов не отменяется, а дорабатывает в фоне
+                    outcomes[name] = await asyncio.wait_for(
+                        asyncio.shield(future), self._remaining(name, started))
+                except Exception as e:
+                    outcomes[name] = e
+        except asyncio.CancelledError:
+            self._abandon(futures)
+            raise
+        return self._snapshot(context, futures, outcomes, errors)
+
+    def _abandon(self, futures):
+        """Сбор прерван: недоработавшие вызовы считаем занятыми, пока они не закончатся"""
+        for name, future in futures.items():
+            if not future.done():
+                self._running[name] = future
+                future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+    def _remaining(self, name, started):
+        """Сколько секунд бюджета сэмплера осталось от начала тика"""
+        return max(0.0, started + self._samplers[name].budget - self._clock())
+
+    def _snapshot(self, context, futures, outcomes, errors):
+        """Собираем SamplerSnapshot из итогов вызовов: (значение, длительность) или исключение"""
+        values = {}
+        durations = {}
+        for name, outcome in outcomes.items():
+            future = futures[name]
+            if (isinstance(outcome, (FuturesTimeoutError, asyncio.TimeoutError))
+                    and not future.done()):
+                self._running[name] = future
+                # Забираем исключение опоздавшего вызова, чтобы asyncio о нем не предупреждал
+                future.add_done_callback(lambda f: f.cancelled() or f.exception())
+                errors[name] = f"не уложился в {self._samplers[name].budget:g} с"
+            elif isinstance(outcome, Exception):
+                errors[name] = str(outcome) or type(outcome).__name__
+            else:
+                values[name], durations[name] = outcome
+        return SamplerSnapshot(self._clock(), context.steam_path, MappingProxyType(values),
+                               MappingProxyType(errors), MappingProxyType(durations))
+
+    def _due(self, names, errors):
+        """Сэмплеры для запуска на этом тике; занятые отмечаются в errors"""
+        due = []
+        for name, sampler in self._samplers.items():
+            if names is not None and name not in names:
+                continue
+            if self.busy(name):
+                errors[name] = "предыдущий замер еще выполняется"
+                continue
+            self._running.pop(name, None)
+            due.append(sampler)
+        return due
+
+    def _run(self, sampler, context):
+        start = self._clock()
+        value = sampler.sample(context)
+        return value, self._clock() - start
+
+def create_sampler_registry(sessions=None, tailer=None, disk_growth=None,
+                            proc_io=None, net_dev=None, executor=None, manifest_tracker=None):
+    """Реестр со стандартными источниками: логи, библиотеки, рост на диске, /proc, сеть"""
+    disk_growth = disk_growth or _disk_growth
+    registry = SamplerRegistry(executor)
+    registry.register(LogSampler(sessions, tailer))
+    registry.register(LibrarySampler(manifest_tracker))
+    registry.register(CallableSampler(
+        "disk", lambda context: disk_growth.sample(context.steam_path, context.libraries)))
+    if proc_io is not None:
+        registry.register(CallableSampler("proc_io", lambda context: proc_io.sample()))
+    if net_dev is not None:
+        registry.register(CallableSampler("network", lambda context: net_dev.sample()))
+    return registry
+
+_default_registry = None
+
+def get_default_registry():
+    """Реестр сэмплеров с глобальным состоянием модуля"""
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = create_sampler_registry(proc_io=_proc_io, net_dev=_net_dev)
+    return _default_registry
+
+# Итог снимка для вывода: status/speed - как у get_download_status
+DownloadState = namedtuple("DownloadState", ["status", "speed", "game_name", "queue"])
+
+def resolve_snapshot(snapshot):
+    """Сводим результаты сэмплеров в DownloadState"""
+    logs = snapshot.values.get("logs")
+    library = snapshot.values.get("libraries")
+    disk = snapshot.values.get("disk")
+    sessions = logs.sessions if logs is not None else {}
+
+    if logs is not None and (not logs.logs_found or logs.stats_paused):
+        status, speed = "пауза", 0
+    else:
+        status, speed = resolve_download_status(
+            logs.session_status if logs is not None else "неактивно",
+            library.download_state if library is not None else (False, 0),
+            library.snapshot.manifests.values() if library is not None else (),
+            disk.speed if disk is not None else 0.0)
+
+    game_name = (active_session_game_name(sessions)
+                 or (logs.game_name if logs is not None else None)
+                 or "Неизвестная игра")
+
+    queue = []
+    if library is not None:
+        per_app_speed = disk.per_app_speed if disk is not None else {}
+        queue = build_download_queue(library.snapshot, sessions,
+                                     lambda appid: per_app_speed.get(appid, 0.0))
+    return DownloadState(status, speed, game_name, queue)
+
+def record_speed_sample(snapshot, history=None):
+    """Добавляем замер из снимка в историю скорости (нужны сэмплеры libraries и disk)"""
+    history = history if history is not None else _speed_history
+    library = snapshot.values.get("libraries")
+    disk = snapshot.values.get("disk")
+    if library is None or disk is None:
+        return False
+    active = [p for p in library.snapshot.manifests.values() if is_active_download(p)]
+    history.append(time.monotonic(), sum(p.bytes_downloaded for p in active), disk.total)
+    return True
+
+def print_download_state(steam_path, registry=None):
+    """Выводим название игры, статус и скорость загрузки"""
+    registry = registry or get_default_registry()
+    snapshot = registry.collect(steam_path)
+    record_speed_sample(snapshot)
+    print_snapshot(snapshot)
+
+def print_snapshot(snapshot):
+    """Выводим снимок состояния загрузок"""
+    state = resolve_snapshot(snapshot)
+
+    print(f"Игра: {state.game_name}")
+    print(f"Статус: {state.status}")
+
+    if state.status == "активно" and state.speed > 0:
+        speed_formatted = format_speed(state.speed)
+        print(f"Скорость загрузки: {speed_formatted}")
+    elif state.status == "активно":
+        print("Скорость загрузки: нет данных")
+    elif state.status == "пауза":
+        print("Загрузка на паузе")
+    else:
+        print("Нет активных загрузок")
+
+    proc_sample = snapshot.values.get("proc_io")
+    if proc_sample is not None:
+        print(f"Запись процессов Steam на диск: {format_speed(proc_sample.write_rate)} "
+              f"(чтение {format_speed(proc_sample.read_rate)}, "
+              f"процессов: {len(proc_sample.pids)})")
+
+    net_sample = snapshot.values.get("network")
+    if net_sample is not None:
+        print(f"Входящий трафик {net_sample.interface}: {format_speed(net_sample.rx_rate)} "
+              f"(Steam: {format_speed(state.speed)})")
+
+    for name, error in snapshot.errors.items():
+        print(f"Источник {name} недоступен: {error}")
+
+    if len(_speed_history) > 1:
+        print(f"Скорость за 5 минут: средняя {format_speed(_speed_history.average_rate(300))}, "
+              f"мин. {format_speed(_speed_history.min_rate(300))}, "
+              f"макс. {format_speed(_speed_history.max_rate(300))}")
+        print(f"Запись на диск за 5 минут: средняя "
+              f"{format_speed(_speed_history.average_rate(300, SpeedSampleBuffer.ON_DISK))}")
+
+    if state.queue:
+        print("Очередь загрузок:")
+    for item in state.queue:
+        label = item.name or f"AppID {item.appid}"
+        print(f"  {label} [{SESSION_LABELS[item.state]}]: {item.percent:.1f}% "
+              f"({format_size(item.bytes_done)} из "
+              f"{format_size(item.bytes_total)}, "
+              f"{format_speed(item.speed)})")
+
+def watch_steam_downloads(poll_interval=60, settle_delay=0.5):
+    """Мониторинг по событиям: статус пересчитывается только при изменении файлов"""
+    print("=== Мониторинг загрузок Steam (по событиям) ===")
+
+    steam_path = get_steam_install_path()
+
+    if not steam_path:
+        print("Ошибка: Steam не найден!")
+        return
+
+    print(f"Путь к Steam: {steam_path}")
+    if load_checkpoint(steam_path):
+        print("Продолжаем с сохраненной контрольной точки")
+
+    watcher = create_watcher(get_watch_dirs(steam_path))
+    try:
+        while True:
+            current_time = datetime.now().strftime("%H:%M:%S")
+            print(f"\n[{current_time}]")
+            print_download_state(steam_path)
+            if not get_default_registry().busy(LogSampler.name):
+                maybe_save_checkpoint(steam_path)
+
+            while True:
+                changed = watcher.wait(poll_interval)
+                if changed is None:
+                    break
+                relevant = [p for p in changed if is_relevant_file(os.path.basename(p))]
+                if relevant:
+                    # Даем Steam дописать пачку изменений, чтобы не пересчитывать
+                    # статус на каждую запись
+                    time.sleep(settle_delay)
+                    watcher.wait(0)
+                    if any(os.path.basename(p) == "libraryfolders.vdf" for p in relevant):
+                        watch_dirs(watcher, get_watch_dirs(steam_path))
+                    break
+    finally:
+        watcher.close()
+        # Прерванный разбор лога еще может идти в пуле - тогда остается прошлая точка
+        if not get_default_registry().busy(LogSampler.name):
+            save_checkpoint_quietly(steam_path)
+
+# Тик расписания: номер, опоздание относительно плана (с) и число пропущенных тиков
+Tick = namedtuple("Tick", ["index", "jitter", "skipped"])
+
+class TickScheduler:
+    """Расписание замеров по monotonic-часам без накопления дрейфа.
+
+    Время каждого тика считается от момента старта (start + n * interval),
+    а не от конца предыдущей итерации, поэтому длительность работы не
+    сдвигает расписание. Если итерация затянулась дольше интервала,
+    пропущенные тики либо выполняются сразу подряд (catch_up=True), либо
+    пропускаются.
+    """
+
+    MIN_INTERVAL = 0.1
+
+    def __init__(self, interval, catch_up=False, clock=time.monotonic, sleep=time.sleep):
+        if interval < self.MIN_INTERVAL:
+            raise ValueError(f"Интервал не может быть меньше {self.MIN_INTERVAL} с")
+        self.interval = interval
+        self.catch_up = catch_up
+        self._clock = clock
+        self._sleep = sleep
+        self._start = clock()
+        self._next = 0
+
+    def wait(self):
+        """Ждем следующего тика и возвращаем Tick"""
+        target = self._start + self._next * self.interval
+        now = self._clock()
+        if now < target:
+            self._sleep(target - now)
+            now = self._clock()
+
+        skipped = 0
+        if not self.catch_up and now - target >= self.interval:
+            skipped = int((now - target) // self.interval)
+            self._next += skipped
+            target = self._start + self._next * self.interval
+
+        tick = Tick(self._next, now - target, skipped)
+        self._next += 1
+        return tick
+
+def monitor_steam_downloads(samples=5, interval=60, catch_up=False, report_interval=None):
+    """Основная функция мониторинга (samples=None - без ограничения по числу замеров)"""
     print("=== Мониторинг загрузок Steam ===")
     print("Скрипт запущен. Начинаем мониторинг...\n")
     
@@ -137,45 +2724,365 @@ def monitor_steam_downloads():
         return
     
     print(f"Путь к Steam: {steam_path}")
+    if load_checkpoint(steam_path):
+        print("Продолжаем с сохраненной контрольной точки")
     
-    # Мониторим в течение 5 минут с интервалом 1 минута
-    for minute in range(5):
-        current_time = datetime.now().strftime("%H:%M:%S")
-        game_name = get_downloading_game_name(steam_path)
-        status, speed_bytes = get_download_status(steam_path)
+    # При частых замерах подробный отчет выводим не на каждом тике
+    report_every = max(1, round((report_interval or interval) / interval))
+    registry = get_default_registry()
+    scheduler = TickScheduler(interval, catch_up=catch_up)
+    while True:
+        tick = scheduler.wait()
+        if samples is not None and tick.index >= samples:
+            break
         
-        print(f"\n[{current_time}] Минута {minute + 1}/5")
-        print(f"Игра: {game_name}")
-        print(f"Статус: {status}")
-        
-        if status == "активно" and speed_bytes > 0:
-            speed_formatted = format_speed(speed_bytes)
-            print(f"Скорость загрузки: {speed_formatted}")
-        elif status == "пауза":
-            print("Загрузка на паузе")
+        if tick.index % report_every:
+            # Между отчетами нужны только источники для истории скорости
+            record_speed_sample(registry.collect(steam_path, names=("libraries", "disk")))
         else:
-            print("Нет активных загрузок")
-        
-        if minute < 4:  # Не ждать после последней итерации
-            time.sleep(60)  # Ждем 1 минуту
+            current_time = datetime.now().strftime("%H:%M:%S")
+            total = f"/{samples}" if samples is not None else ""
+            print(f"\n[{current_time}] Замер {tick.index + 1}{total} "
+                  f"(джиттер {tick.jitter * 1000:.1f} мс"
+                  f"{f', пропущено {tick.skipped}' if tick.skipped else ''})")
+            print_download_state(steam_path, registry)
+        # Пока разбор лога идет в фоне, его состояние не сохраняем
+        if not registry.busy(LogSampler.name):
+            maybe_save_checkpoint(steam_path)
+        # После последнего замера не ждем еще один интервал
+        if samples is not None and tick.index + 1 >= samples:
+            break
     
+    # Первый разбор большого лога может выйти за бюджет и идти в фоне:
+    # даем ему закончиться, иначе сохранять его состояние нельзя
+    if registry.wait_idle(LogSampler.name, FINAL_CHECKPOINT_WAIT):
+        save_checkpoint_quietly(steam_path)
     print("\n=== Мониторинг завершен ===")
 
+# Снимок одного корня Steam в общем потоке: tick - номер замера этого корня
+RootSnapshot = namedtuple("RootSnapshot", ["root", "tick", "snapshot", "state"])
+
+class MultiRootMonitor:
+    """Параллельный мониторинг нескольких корней Steam (разные пользователи, SteamCMD).
+
+    У каждого корня свое состояние - разбор лога, сессии загрузок, прогресс
+    манифестов, рост файлов на диске - и свой цикл замеров на asyncio.
+    Блокирующий ввод-вывод выполняется в общем ограниченном пуле потоков,
+    а семафор ограничивает число корней, опрашиваемых одновременно, чтобы
+    очередь пула не съедала бюджеты сэмплеров. Замеры всех корней сливаются
+    в один поток RootSnapshot по мере готовности.
+
+    Общие для машины источники (/proc, сеть) сюда не входят: они не
+    относятся к конкретному корню.
+    """
+
+    MAX_WORKERS = 16
+    MAX_CONCURRENT_ROOTS = 8
+
+    def __init__(self, roots, interval=60, max_workers=MAX_WORKERS,
+                 max_concurrent_roots=MAX_CONCURRENT_ROOTS):
+        if interval < TickScheduler.MIN_INTERVAL:
+            raise ValueError(f"Интервал не может быть меньше {TickScheduler.MIN_INTERVAL} с")
+        # Один и тот же корень дважды не опрашиваем
+        self.roots = list(OrderedDict.fromkeys(os.path.abspath(root) for root in roots))
+        self.interval = interval
+        self.max_concurrent_roots = max_concurrent_roots
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="steam-root")
+        self._tailers = {}
+        self._sessions = {}
+        self._registries = {}
+        for root in self.roots:
+            self._tailers[root] = LogTailer()
+            self._sessions[root] = DownloadSessionTracker()
+            self._registries[root] = create_sampler_registry(
+                sessions=self._sessions[root], tailer=self._tailers[root],
+                disk_growth=DiskGrowthSampler(), executor=self._executor,
+                manifest_tracker=ManifestProgressTracker())
+
+    async def stream(self, samples=None):
+        """Асинхронный генератор RootSnapshot по всем корням (samples - замеров на корень)"""
+        loop = asyncio.get_running_loop()
+        # Ограниченная очередь: медленный потребитель притормаживает опрос
+        queue = asyncio.Queue(maxsize=max(1, len(self.roots)))
+        semaphore = asyncio.Semaphore(self.max_concurrent_roots)
+        for root in self.roots:
+            await loop.run_in_executor(self._executor, load_checkpoint, root,
+                                       self._tailers[root], self._sessions[root])
+        stop = asyncio.Event()
+        tasks = [asyncio.ensure_future(self._watch_root(root, samples, queue, semaphore, stop))
+                 for root in self.roots]
+        remaining = len(tasks)
+        try:
+            while remaining:
+                item = await queue.get()
+                if item is None:
+                    remaining -= 1
+                    continue
+                yield item
+        finally:
+            stop.set()
+            for task in tasks:
+                task.cancel()
+            # Отмена может проиграть гонку с завершившимся замером, и задача
+            # успеет сделать put; разбираем очередь, пока все задачи не выйдут
+            pending = set(tasks)
+            while pending:
+                while not queue.empty():
+                    queue.get_nowait()
+                _, pending = await asyncio.wait(pending, timeout=0.05)
+            for root in self.roots:
+                # Замер, прерванный отменой, может еще разбирать лог в пуле:
+                # сохранять состояние посреди разбора нельзя, остается прошлая точка
+                if self._registries[root].busy(LogSampler.name):
+                    continue
+                await loop.run_in_executor(self._executor, self._save_checkpoint, root)
+
+    async def _watch_root(self, root, samples, queue, semaphore, stop):
+        loop = asyncio.get_running_loop()
+        registry = self._registries[root]
+        start = loop.time()
+        tick = 0
+        while not stop.is_set() and (samples is None or tick < samples):
+            try:
+                async with semaphore:
+                    snapshot = await registry.collect_async(root)
+                    state = await loop.run_in_executor(self._executor,
+                                                       resolve_snapshot, snapshot)
+            except Exception as e:
+                print(f"Ошибка при опросе {root}: {e}")
+            else:
+                await queue.put(RootSnapshot(root, tick, snapshot, state))
+            # Сохраняемся и по ходу работы, а не только при выходе: убитый
+            # процесс иначе начнет разбор лога заново
+            if not registry.busy(LogSampler.name):
+                await loop.run_in_executor(self._executor, maybe_save_checkpoint, root,
+                                           CHECKPOINT_INTERVAL, self._tailers[root],
+                                           self._sessions[root])
+            tick += 1
+            # Расписание от момента старта, как у TickScheduler; опоздавший
+            # тик выполняется сразу, без досыпания
+            delay = start + tick * self.interval - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await queue.put(None)
+
+    def _save_checkpoint(self, root):
+        save_checkpoint_quietly(root, self._tailers[root], self._sessions[root])
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+async def monitor_steam_roots(roots, samples=5, interval=60):
+    """Мониторинг нескольких корней Steam: одна строка на каждый замер корня"""
+    print(f"=== Мониторинг загрузок Steam: корней {len(roots)} ===")
+    for root in roots:
+        if not is_steam_root(root):
+            print(f"Предупреждение: {root} не похож на каталог Steam")
+
+    monitor = MultiRootMonitor(roots, interval)
+    stream = monitor.stream(samples)
+    try:
+        async for item in stream:
+            current_time = datetime.now().strftime("%H:%M:%S")
+            state = item.state
+            speed = f", {format_speed(state.speed)}" if state.status == "активно" else ""
+            errors = f" (недоступно: {', '.join(item.snapshot.errors)})" if item.snapshot.errors else ""
+            print(f"[{current_time}] {item.root} #{item.tick + 1}: "
+                  f"{state.game_name} - {state.status}{speed}, "
+                  f"в очереди {len(state.queue)}{errors}")
+    finally:
+        # Генератор закрываем явно, пока пул жив: его finally останавливает
+        # опрос корней и сохраняет контрольные точки
+        await stream.aclose()
+        monitor.close()
+    print("\n=== Мониторинг завершен ===")
+
+# Шаблоны строк для синтетического content_log в бенчмарках
+SYNTHETIC_LOG_TEMPLATES = (
+    "[{ts}] AppID {appid} update started : download 0/{total}, store 0/0, reuse 0/0, delta 0/0, stage 0/0\n",
+    "[{ts}] AppID {appid} state changed : Update Required,Update Queued,Update Running,\n",
+    "[{ts}] AppID {appid} update changed : Running Update,Downloading,\n",
+    "[{ts}] Got 2 download sources and 0 caching proxies via ContentServerDirectoryService\n",
+    "[{ts}] Created download interface of type 'SteamCache' (7) to host cache{appid}.steamcontent.com\n",
+    "[{ts}] Depot {depot} progress : download {done}/{total}\n",
+    "[{ts}] Downloading app {appid} Synthetic Game {appid}\n",
+    "[{ts}] AppID {appid} update canceled : Suspended (download {done}/{total})\n",
+    "[{ts}] AppID {appid} scheduler finished : removed from schedule (result No Error, state 0xc)\n",
+)
+
+def write_synthetic_content_log(path, size_bytes):
+    """Пишем синтетический content_log заданного размера; возвращаем число строк"""
+    base = time.mktime((2024, 1, 1, 0, 0, 0, 0, 0, -1))
+    written = 0
+    count = 0
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        while written < size_bytes:
+            # Пишем пачками, чтобы генерация не занимала больше времени, чем разбор
+            ts = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(base + count // 50))
+            batch = "".join(
+                template.format(ts=ts, appid=730 + i, depot=731 + i,
+                                done=count * 4096, total=70347325088)
+                for i, template in enumerate(SYNTHETIC_LOG_TEMPLATES)
+            ) * 10
+            f.write(batch)
+            written += len(batch)
+            count += 10 * len(SYNTHETIC_LOG_TEMPLATES)
+    return count
+
+def _legacy_classify_line(line):
+    """Прежний разбор строки: попытка json.loads и re.search на каждой строке"""
+    if '"appid"' in line and '"name"' in line:
+        try:
+            json_start = line.find('{')
+            if json_start != -1:
+                data = json.loads(line[json_start:])
+                if 'name' in data:
+                    return data['name']
+        except:
+            pass
+    match = re.search(r'Downloading app (\d+)\s+(.+?)(?:\n|$)', line)
+    if match:
+        return match.group(2).strip()
+    return None
+
+def _time_line_parser(path, parse_line):
+    """Прогоняем parse_line по всем строкам файла; возвращаем (строк, событий, секунд)"""
+    lines = 0
+    events = 0
+    started = time.perf_counter()
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            lines += 1
+            if parse_line(line) is not None:
+                events += 1
+    return lines, events, time.perf_counter() - started
+
+def benchmark_line_classifier(size_bytes=1 << 30):
+    """Сравниваем префиксный классификатор с прежним разбором на синтетическом логе"""
+    fd, path = tempfile.mkstemp(prefix="content_log_bench_", suffix=".txt")
+    os.close(fd)
+    try:
+        print(f"Генерируем синтетический лог {format_size(size_bytes)}...")
+        write_synthetic_content_log(path, size_bytes)
+        for title, parse_line in (
+                ("поиск названия: прежний (re.search + json)", _legacy_classify_line),
+                ("поиск названия: проверка префикса + regex", game_name_from_line),
+                ("полный разбор в типизированные события", parse_content_log_line)):
+            lines, events, elapsed = _time_line_parser(path, parse_line)
+            print(f"{title}: {lines} строк, {events} совпадений за {elapsed:.2f} с "
+                  f"({lines / elapsed:,.0f} строк/с)")
+    finally:
+        os.unlink(path)
+
+def benchmark_timestamp_parser(count=1000000):
+    """Сравниваем кэширующий разбор времени с datetime.strptime и time.mktime"""
+    base = time.mktime((2024, 1, 1, 0, 0, 0, 0, 0, -1))
+    # Несколько суток логов, по строке в секунду
+    lines = [time.strftime("[%Y-%m-%d %H:%M:%S] AppID 730 state changed : ",
+                           time.localtime(base + i * 0.25))
+             for i in range(count)]
+
+    def strptime_parse(line):
+        return datetime.strptime(line[1:20], "%Y-%m-%d %H:%M:%S").timestamp()
+
+    def mktime_parse(line):
+        return time.mktime((int(line[1:5]), int(line[6:8]), int(line[9:11]),
+                            int(line[12:14]), int(line[15:17]), int(line[18:20]),
+                            0, 0, -1))
+
+    parser = LogTimestampParser()
+    expected = [mktime_parse(line) for line in lines[:1000]]
+    if [parser(line) for line in lines[:1000]] != expected:
+        print("Ошибка: результаты разбора времени расходятся")
+        return
+    for title, parse in (("datetime.strptime", strptime_parse),
+                         ("time.mktime на каждую строку", mktime_parse),
+                         ("кэш даты + срезы (LogTimestampParser)", LogTimestampParser())):
+        started = time.perf_counter()
+        for line in lines:
+            parse(line)
+        elapsed = time.perf_counter() - started
+        print(f"{title}: {count / elapsed:,.0f} строк/с ({elapsed * 1e9 / count:.0f} нс на строку)")
+
+def run_benchmarks(size_bytes=1 << 30):
+    """Запускаем все бенчмарки трекера"""
+    print("=== Бенчмарки ===")
+    benchmark_timestamp_parser()
+    benchmark_line_classifier(size_bytes)
+
+def parse_args(argv=None):
+    """Разбираем аргументы командной строки"""
+    parser = argparse.ArgumentParser(description="Мониторинг загрузок Steam")
+    parser.add_argument("--background", action="store_true",
+                        help="работать без ограничения по времени")
+    parser.add_argument("--watch", action="store_true",
+                        help="пересчитывать статус по событиям файловой системы")
+    parser.add_argument("--interval", type=float, default=60,
+                        help="интервал между замерами, с (от 0.1, по умолчанию 60)")
+    parser.add_argument("--samples", type=int, default=5,
+                        help="число замеров в обычном режиме (по умолчанию 5)")
+    parser.add_argument("--report-interval", type=float, default=None,
+                        help="как часто выводить подробный отчет, с (по умолчанию - каждый замер)")
+    parser.add_argument("--catch-up", action="store_true",
+                        help="выполнять пропущенные замеры, а не пропускать их")
+    parser.add_argument("--roots", nargs="+", default=None, metavar="PATH",
+                        help="опрашивать одновременно несколько каталогов Steam/SteamCMD")
+    parser.add_argument("--iface", default=None,
+                        help="сетевой интерфейс для замера входящего трафика (Linux, /proc/net/dev)")
+    parser.add_argument("--timeline", action="store_true",
+                        help="вывести общую ленту content/connection/bootstrap логов по времени")
+    parser.add_argument("--follow", action="store_true",
+                        help="с --timeline: продолжать выводить новые строки логов")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="запустить бенчмарки разбора логов и выйти")
+    parser.add_argument("--benchmark-size", type=int, default=1024,
+                        help="размер синтетического лога для бенчмарка, МБ (по умолчанию 1024)")
+    args = parser.parse_args(argv)
+    if args.interval < TickScheduler.MIN_INTERVAL:
+        parser.error(f"--interval не может быть меньше {TickScheduler.MIN_INTERVAL}")
+    return args
+
 def run_in_background():
     """Запуск в фоновом режиме"""
-    import sys
+    args = parse_args()
     
-    if len(sys.argv) > 1 and sys.argv[1] == "--background":
-        # В фоновом режиме
-        while True:
-            monitor_steam_downloads()
-            print("\nПерезапуск мониторинга через 5 минут...")
-            time.sleep(300)  # Пауза 5 минут перед перезапуском
+    if args.iface:
+        try:
+            configure_network_sampler(args.iface)
+        except (OSError, ValueError) as e:
+            print(f"Замер трафика недоступен: {e}")
+    
+    if args.benchmark:
+        run_benchmarks(args.benchmark_size * 1024 * 1024)
+    elif args.timeline:
+        steam_path = get_steam_install_path()
+        if not steam_path:
+            print("Ошибка: Steam не найден!")
+            return
+        print_log_timeline(steam_path, follow=args.follow)
+    elif args.roots:
+        # Несколько корней Steam в одном процессе
+        asyncio.run(monitor_steam_roots(args.roots,
+                                        samples=None if args.background else args.samples,
+                                        interval=args.interval))
+    elif args.watch:
+        # Мониторинг по событиям файловой системы (inotify на Linux)
+        watch_steam_downloads(poll_interval=args.interval)
+    elif args.background:
+        # В фоновом режиме замеры идут непрерывно по одному расписанию
+        monitor_steam_downloads(samples=None, interval=args.interval,
+                                catch_up=args.catch_up,
+                                report_interval=args.report_interval)
     else:
-        # Обычный запуск на 5 минут
-        monitor_steam_downloads()
+        # Обычный запуск: несколько замеров с заданным интервалом
+        monitor_steam_downloads(samples=args.samples, interval=args.interval,
+                                catch_up=args.catch_up,
+                                report_interval=args.report_interval)
 
 if __name__ == "__main__":
     # Для запуска в фоне используйте: python steam_monitor.py --background
     # Для однократного запуска: python steam_monitor.py
+    # Для мониторинга по событиям: python steam_monitor.py --watch
+    # Для частых замеров: python steam_monitor.py --interval 0.1 --report-interval 5
     run_in_background()